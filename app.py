@@ -1,21 +1,49 @@
-from flask import Flask, render_template, redirect, url_for, request, session, jsonify, send_from_directory
-from flask_socketio import SocketIO, emit
+from flask import (Flask, Blueprint, Request, render_template, redirect, url_for, request, session, jsonify,
+                   send_from_directory, g)
+from flask_socketio import SocketIO, emit, join_room
 from flask_cors import CORS
-import json
 from datetime import datetime
 import os
 import requests
 from dotenv import load_dotenv
 from werkzeug.utils import secure_filename
 import uuid
+import threading
 import time
+from appointment_store import AppointmentStore
+from broadcaster import Broadcaster, DOCTORS_ROOM, PATIENTS_ROOM, patient_room
+from blob_store import BlobStore, BlobWriter, UploadTooLarge, BLOB_NAME
+from file_index import FileIndex
+from file_search import FileSearch
+from groq_client import get_client, GROQ_MODEL
+from response_cache import ResponseCache, SingleFlight, make_key
+from resilience import (CircuitBreaker, CircuitOpen, LatencyWindow, RETRYABLE_STATUS,
+                        backoff_delay, hedge, retry_after_seconds)
+from fallbacks import GENERAL_FALLBACK, diabetes_fallback, hypertension_fallback
+from http_cache import make_etag, conditional_json
+from lazy import Lazy
+import metrics
+from metrics import Registry, SamplingProfiler, ProfilerBusy, timed
+from preview_pipeline import PreviewPipeline
+from reading_schema import DIABETES, HYPERTENSION, SchemaError
+from reading_store import ReadingStore
+from trends import TrendTracker, MAX_DAYS
+from triage import TriageIndex, reading_view
+from state_backend import create_backend
+from risk_engine import classify_glucose, classify_bp
+from worker_pool import LLMWorkerPool, QueueFull, HIGH, NORMAL
+from rate_limiter import RateLimiter, estimate_tokens
+from conversation import ConversationStore, local_summary
+from prompts import choose_variant, get_template
 
-app = Flask(__name__)
-CORS(app)
-app.secret_key = 'GROQ_API_KEY'
-socketio = SocketIO(app, cors_allowed_origins="*")
+# The Flask app is built by create_app(config) at the bottom of this file;
+# `app.app` (e.g. `gunicorn app:app`) builds a default one on first access.
+# The Socket.IO server is bound to it there. With several worker processes or
+# nodes, SOCKETIO_MESSAGE_QUEUE (e.g. redis://localhost:6379/0) relays every
+# emit through a shared queue so each worker's clients receive it
+socketio = SocketIO()
 
-# Load environment variables for Groq
+# Load environment variables for Groq (the settings below are read from them)
 load_dotenv()
 api_key = os.getenv("GROQ_API_KEY")
 
@@ -28,76 +56,570 @@ HARDCODED_CREDENTIALS = {
     'doctor': {'password': 'doctor123', 'role': 'doctor'}
 }
 
-# Create data directory if it doesn't exist
+# Default data directory (readings, state, search index); created by create_app()
 DATA_DIR = "data"
-UPLOAD_FOLDER = os.path.join('static', 'uploads')
-if not os.path.exists(DATA_DIR):
-    os.makedirs(DATA_DIR)
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+
+# Subsystems create_app() can register. SUBSYSTEMS (config or environment,
+# comma-separated) picks a subset, e.g. workers that only serve uploads;
+# login pages, Socket.IO connections and /metrics are always there.
+SUBSYSTEMS = ('uploads', 'appointments', 'chatbot', 'readings')
+
+# Settings passed to create_app(); they take precedence over the environment
+settings = {}
+
+def setting(name, default=None):
+    """A create_app() config value, else the environment variable, else default"""
+    if name in settings:
+        return settings[name]
+    return os.getenv(name, default)
+
+def data_path(name):
+    return os.path.join(setting('DATA_DIR', DATA_DIR), name)
+
+def load_settings():
+    """Read the plain settings below through setting().
+
+    Runs at import and again in create_app(), so its config applies to them
+    too. GROQ_API_KEY and the connection settings in groq_client.py
+    (GROQ_API_URL, GROQ_MODEL, GROQ_POOL_SIZE, GROQ_*_TIMEOUT) are read from
+    the environment only, since dia.py and hyper.py share that client.
+    """
+    global UPLOAD_FOLDER, PREVIEW_FOLDER, MAX_UPLOAD_BYTES, TRIAGE_MAX_AGE, TRIAGE_PUSH_SIZE
+    global STREAM_RESPONSES, GROQ_MAX_RETRIES, GROQ_RETRY_BUDGET, GROQ_HEDGE_PERCENTILE
+    global PROMPT_VARIANT, CHAT_MEMORY_SUMMARY, PROFILER_ENABLED
+
+    # Uploaded files and their thumbnails / first-page previews; uploads are
+    # stored once per distinct content, capped at MAX_UPLOAD_MB
+    UPLOAD_FOLDER = setting('UPLOAD_FOLDER', os.path.join('static', 'uploads'))
+    PREVIEW_FOLDER = setting('PREVIEW_FOLDER', os.path.join('static', 'previews'))
+    MAX_UPLOAD_BYTES = int(float(setting('MAX_UPLOAD_MB', '25')) * 1024 * 1024)
+
+    # Triage looks at readings from the last TRIAGE_MAX_AGE_HOURS; the top
+    # TRIAGE_PUSH_SIZE patients are pushed to doctors when they change
+    TRIAGE_MAX_AGE = float(setting('TRIAGE_MAX_AGE_HOURS', '168')) * 3600
+    TRIAGE_PUSH_SIZE = int(setting('TRIAGE_PUSH_SIZE', '10'))
+
+    # Stream completions chunk by chunk unless the client asks otherwise
+    STREAM_RESPONSES = str(setting('STREAM_RESPONSES', 'false')).lower() == 'true'
+
+    # Retry 429/5xx from Groq with jittered backoff, spending at most
+    # GROQ_RETRY_BUDGET seconds backing off. Send a second request once a call
+    # is slower than GROQ_HEDGE_PERCENTILE of recent calls (e.g. 0.95); 0
+    # turns hedging off. Streams are never hedged.
+    GROQ_MAX_RETRIES = int(setting('GROQ_MAX_RETRIES', '2'))
+    GROQ_RETRY_BUDGET = float(setting('GROQ_RETRY_BUDGET', '10'))
+    GROQ_HEDGE_PERCENTILE = float(setting('GROQ_HEDGE_PERCENTILE', '0'))
+
+    # Analysis prompt templates (prompts.py): 'verbose', 'compact', or 'ab' to
+    # split users between the two and compare latency and token use per template
+    PROMPT_VARIANT = setting('PROMPT_VARIANT', 'verbose')
+
+    # Chat memory summaries: a local digest, or 'llm' to have Groq write them
+    CHAT_MEMORY_SUMMARY = setting('CHAT_MEMORY_SUMMARY', 'local')
+
+    # Opt-in sampling profiler behind /debug/profile
+    PROFILER_ENABLED = str(setting('PROFILER_ENABLED', 'false')).lower() == 'true'
+
+load_settings()
+
+# Databases, journals, backfills and worker pools are built on first use
+# (lazy.py), so a worker only pays for the subsystems it actually serves.
+# PRELOAD_SERVICES (comma-separated names, or 'all') builds some in the
+# background right after startup instead, e.g. trend_tracker,triage_index
+# when a large reading history makes their backfill slow.
+services = {}
+
+def service(name):
+    """Decorator: the function becomes a Lazy service built by calling it"""
+    def register(factory):
+        services[name] = Lazy(name, factory)
+        return services[name]
+    return register
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'doc', 'docx'}
 
+# Uploads, stored once per distinct content
+@service('blob_store')
+def blob_store():
+    return BlobStore(UPLOAD_FOLDER, max_bytes=MAX_UPLOAD_BYTES)
+
+# Thumbnails / first-page previews, rendered in background worker processes
+@service('preview_pipeline')
+def preview_pipeline():
+    return PreviewPipeline(PREVIEW_FOLDER, workers=int(setting('PREVIEW_WORKERS', '2')))
+
+# Content-addressed files never change, so browsers may keep them for a year.
+# USE_X_SENDFILE hands file bodies to a fronting nginx/Apache instead of Python.
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Shared state (appointments, file records, latest readings): 'memory' for a
+# single process, 'sqlite' to share one WAL-mode database between workers.
+# The memory backend writes every change to a journal and snapshots it every
+# STATE_SNAPSHOT_EVERY changes, so restarts recover without losing updates.
+# Set STATE_JOURNAL_DIR to an empty string to keep state purely in memory.
+@service('state_backend')
+def state_backend():
+    return create_backend(
+        setting('STATE_BACKEND', 'memory'),
+        setting('STATE_DB', data_path('state.db')),
+        journal_dir=setting('STATE_JOURNAL_DIR', data_path('journal')),
+        snapshot_every=int(setting('STATE_SNAPSHOT_EVERY', '10000'))
+    )
+
+# Reading history lives in an indexed SQLite store; the latest_readings
+# collection is the dashboard's view of the most recent reading per condition
+@service('reading_store')
+def reading_store():
+    return ReadingStore(setting('READINGS_DB', data_path('readings.db')))
+
+def latest_reading_view(reading):
+    if reading is None:
+        return None
+    return reading_view(reading)
+
+# Rolling trend aggregates, backfilled from the last MAX_DAYS days of history
+@service('trend_tracker')
+def trend_tracker():
+    tracker = TrendTracker()
+    tracker.backfill(reading_store.query(start=time.time() - MAX_DAYS * 86400, limit=None))
+    return tracker
+
+# Doctors' "who needs attention now" ranking over every patient's latest
+# readings; the top TRIAGE_PUSH_SIZE are pushed to doctors when they change
+@service('triage_index')
+def triage_index():
+    index = TriageIndex(max_age=TRIAGE_MAX_AGE)
+    index.backfill(reading_store.query(start=time.time() - TRIAGE_MAX_AGE, limit=None))
+    return index
+
+last_triage_top = None
+
 # Store latest readings, appointments and shared files
-latest_readings = {
-    'diabetes': None,
-    'hypertension': None
-}
+CONDITIONS = ('diabetes', 'hypertension')
+
+latest_readings_seeded = False
+seed_lock = threading.Lock()
+
+def seed_latest_readings():
+    """Fill gaps in the dashboard view from reading history (e.g. a new state backend), once per process"""
+    global latest_readings_seeded
+    if latest_readings_seeded:
+        return
+    with seed_lock:
+        if latest_readings_seeded:
+            return
+        for condition in CONDITIONS:
+            if state_backend.get('latest_readings', condition) is None:
+                view = latest_reading_view(reading_store.latest(condition))
+                if view is not None:
+                    state_backend.put('latest_readings', condition, view)
+        latest_readings_seeded = True
+
+def get_latest_readings_view():
+    seed_latest_readings()
+    return {condition: state_backend.get('latest_readings', condition) for condition in CONDITIONS}
+
+@service('appointment_store')
+def appointment_store():
+    return AppointmentStore(state_backend.resolve())
+
+@service('file_index')
+def file_index():
+    return FileIndex(state_backend.resolve())
+
+# Full-text search over shared files. Text is extracted in background worker
+# processes after upload; files missing from the index (e.g. uploaded before
+# it existed) are queued when the index is first used.
+@service('file_search')
+def file_search():
+    search = FileSearch(setting('SEARCH_DB', data_path('search.db')),
+                        workers=int(setting('SEARCH_WORKERS', '1')))
+    indexed_file_ids = search.indexed_ids()
+    for file_record in file_index.all():
+        if file_record['id'] not in indexed_file_ids:
+            search.submit(file_record)
+    return search
+
+# Background pool for Groq calls so slow completions don't block Socket.IO handlers
+@service('llm_pool')
+def llm_pool():
+    return LLMWorkerPool(
+        workers=int(setting('LLM_WORKERS', '4')),
+        max_queue=int(setting('LLM_QUEUE_SIZE', '100')),
+        max_per_session=int(setting('LLM_SESSION_QUEUE_SIZE', '3')),
+        policy=setting('LLM_REJECT_POLICY', 'reject'),
+        spawn=socketio.start_background_task
+    )
+
+# Chat completion settings and the response cache in front of them
+CHAT_SYSTEM_PROMPT = "You are a helpful healthcare assistant."
+CHAT_TEMPERATURE = 0.5
+CHAT_MAX_TOKENS = 200
+
+@service('response_cache')
+def response_cache():
+    return ResponseCache(
+        max_entries=int(setting('RESPONSE_CACHE_SIZE', '512')),
+        ttl=float(setting('RESPONSE_CACHE_TTL', '3600'))
+    )
+
+inflight_requests = SingleFlight()
+
+# Upstream resilience: fail fast to a local template while Groq is unhealthy,
+# retry 429/5xx with jittered backoff, and optionally hedge slow calls
+@service('groq_breaker')
+def groq_breaker():
+    return CircuitBreaker(
+        window=float(setting('GROQ_BREAKER_WINDOW', '60')),
+        min_calls=int(setting('GROQ_BREAKER_MIN_CALLS', '10')),
+        failure_rate=float(setting('GROQ_BREAKER_FAILURE_RATE', '0.5')),
+        slow_call_seconds=float(setting('GROQ_BREAKER_SLOW_SECONDS', '10')),
+        slow_call_rate=float(setting('GROQ_BREAKER_SLOW_RATE', '0.5')),
+        open_seconds=float(setting('GROQ_BREAKER_OPEN_SECONDS', '30'))
+    )
+
+HEDGE_MIN_SAMPLES = 20
+groq_latency = LatencyWindow()
+
+# Admission control: per-user and global token buckets, in requests and
+# estimated tokens. Chat can't use the last RATE_LIMIT_RESERVE of the global
+# budget; that is kept for analyses and doctors. With the sqlite state
+# backend the global buckets are kept in it, shared by every worker.
+@service('rate_limiter')
+def rate_limiter():
+    shared = setting('STATE_BACKEND', 'memory') == 'sqlite'
+    return RateLimiter(
+        user_rpm=float(setting('RATE_LIMIT_USER_RPM', '20')),
+        user_burst=float(setting('RATE_LIMIT_USER_BURST', '5')),
+        user_tpm=float(setting('RATE_LIMIT_USER_TPM', '8000')),
+        global_rpm=float(setting('RATE_LIMIT_GLOBAL_RPM', '300')),
+        global_tpm=float(setting('RATE_LIMIT_GLOBAL_TPM', '120000')),
+        reserve=float(setting('RATE_LIMIT_RESERVE', '0.2')),
+        shared=state_backend.resolve() if shared else None
+    )
+
+# Chat memory: recent turns per session (per user when logged in) within
+# CHAT_MEMORY_TOKENS; older turns are folded into a rolling summary
+@service('conversations')
+def conversations():
+    return ConversationStore(
+        budget_tokens=int(setting('CHAT_MEMORY_TOKENS', '1500')),
+        summary_tokens=int(setting('CHAT_MEMORY_SUMMARY_TOKENS', '300')),
+        max_turns=int(setting('CHAT_MEMORY_TURNS', '20')),
+        max_sessions=int(setting('CHAT_MEMORY_SESSIONS', '1000')),
+        idle_seconds=float(setting('CHAT_MEMORY_IDLE_SECONDS', '1800')),
+        summarize=summarize_conversation
+    )
+
+# Instructions for chat memory summaries written by Groq (CHAT_MEMORY_SUMMARY=llm)
+SUMMARY_SYSTEM_PROMPT = ("Summarize this conversation between a patient and a healthcare assistant in at most "
+                         "80 words. Keep readings, symptoms, medications and open questions.")
 
-appointments = []
-shared_files = []
+# Targeted broadcasts: events go to role/patient rooms, coalesced per window
+@service('broadcaster')
+def broadcaster():
+    return Broadcaster(
+        socketio,
+        window=float(setting('SOCKETIO_COALESCE_MS', '50')) / 1000,
+        merge_events=('readings_update',)
+    )
+
+# ================== Metrics ==================
+# Scraped by Prometheus from /metrics
+registry = Registry()
+
+def service_stat(lazy_service, key):
+    """Gauge callback for one of a lazy service's stats(); 0 until the service is built"""
+    return lambda: lazy_service.stats()[key] if lazy_service.built else 0
+
+chat_latency = registry.histogram(
+    'healthsync_chat_with_groq_seconds', 'chat_with_groq latency by outcome and upstream status',
+    ['outcome', 'status'])
+http_latency = registry.histogram(
+    'healthsync_http_request_seconds', 'HTTP handler latency', ['route', 'method', 'status'])
+socket_latency = registry.histogram(
+    'healthsync_socketio_event_seconds', 'Socket.IO event handler latency', ['event'])
+connected_sockets = registry.gauge('healthsync_connected_sockets', 'Currently connected Socket.IO clients')
+registry.gauge('healthsync_llm_queue_pending', 'LLM jobs waiting for a worker',
+               callback=service_stat(llm_pool, 'pending'))
+registry.gauge('healthsync_llm_jobs_active', 'LLM jobs currently running',
+               callback=service_stat(llm_pool, 'active'))
+registry.gauge('healthsync_llm_sessions', 'Sessions with queued or running LLM jobs',
+               callback=service_stat(llm_pool, 'sessions'))
+registry.gauge('healthsync_groq_circuit_open', 'Groq circuit state (0 closed, 1 half-open, 2 open)',
+               callback=lambda: {'closed': 0, 'half_open': 1, 'open': 2}[groq_breaker.state]
+               if groq_breaker.built else 0)
+upstream_retries = registry.counter('healthsync_groq_retries_total', 'Retried Groq calls by cause', ['reason'])
+rate_limited = registry.counter('healthsync_rate_limited_total', 'LLM requests refused by the rate limiter',
+                                ['scope', 'limit'])
+registry.gauge('healthsync_rate_limit_global_tokens_available', 'Estimated tokens left in the global bucket',
+               callback=service_stat(rate_limiter, 'global_tokens_available'))
+hedged_requests = registry.counter('healthsync_groq_hedged_total', 'Groq calls that sent a hedge request')
+prompt_tokens = registry.counter(
+    'healthsync_prompt_tokens_total', 'Estimated prompt tokens sent, by prompt template', ['template'])
+completion_tokens = registry.counter(
+    'healthsync_completion_tokens_total', 'Estimated completion tokens received, by prompt template', ['template'])
+analysis_latency = registry.histogram(
+    'healthsync_analysis_seconds', 'Reading analysis latency by prompt template', ['template'])
+registry.gauge('healthsync_search_documents', 'Files in the full-text search index',
+               callback=service_stat(file_search, 'documents'))
+registry.gauge('healthsync_search_pending', 'Files waiting for text extraction',
+               callback=service_stat(file_search, 'pending'))
+registry.gauge('healthsync_chat_memory_sessions', 'Conversations held in chat memory',
+               callback=service_stat(conversations, 'sessions'))
+registry.gauge('healthsync_chat_memory_compactions', 'Chat memory compactions since start',
+               callback=service_stat(conversations, 'compactions'))
+registry.gauge('healthsync_triage_patients', 'Patients in the triage index',
+               callback=service_stat(triage_index, 'patients'))
+registry.gauge('healthsync_response_cache_entries', 'Cached chat responses',
+               callback=service_stat(response_cache, 'size'))
+registry.gauge('healthsync_response_cache_hits', 'Response cache hits since start',
+               callback=service_stat(response_cache, 'hits'))
+registry.gauge('healthsync_response_cache_misses', 'Response cache misses since start',
+               callback=service_stat(response_cache, 'misses'))
+
+# Opt-in sampling profiler (PROFILER_ENABLED); GET /debug/profile?seconds=N returns folded stacks
+PROFILER_MAX_SECONDS = 60
+
+@service('profiler')
+def profiler():
+    return SamplingProfiler(
+        interval=float(setting('PROFILER_INTERVAL_MS', '5')) / 1000,
+        output_dir=data_path('profiles')
+    )
+
+def timed_event(event):
+    """Record a Socket.IO handler's duration under its event name"""
+    return timed(socket_latency, event=event)
+
+def start_request_timer():
+    g.started_at = time.perf_counter()
+
+def record_request_time(response):
+    started_at = g.get('started_at')
+    if started_at is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_latency.observe(time.perf_counter() - started_at,
+                             route=route, method=request.method, status=response.status_code)
+    return response
+
+BUSY_MESSAGE = "I'm handling a lot of requests right now. Please try again in a moment."
+RATE_LIMITED_MESSAGE = "You're sending requests faster than I can answer them. Please wait a moment and try again."
+
+def current_username(default='patient'):
+    user = session.get('user')
+    return user['username'] if user else default
+
+def care_team_rooms(patient):
+    """Rooms that care about a patient's data: the patient and all doctors"""
+    return {DOCTORS_ROOM, patient_room(patient)}
+
+def uploader_rooms(user):
+    # Doctors share files with patients; patients share with doctors
+    if user['role'] == 'patient':
+        return care_team_rooms(user['username'])
+    return {DOCTORS_ROOM, PATIENTS_ROOM}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def chat_with_groq(prompt):
-    """Simple, direct implementation of chat functionality"""
+def page_limit(args, default, maximum):
+    """?limit= clamped to 1..maximum; raises ValueError if it isn't an integer"""
+    return min(max(int(args.get('limit', default)), 1), maximum)
+
+def call_groq(messages, on_chunk=None, max_tokens=CHAT_MAX_TOKENS):
+    """Make one Groq call and return the completion text, raising on any failure"""
+    client = get_client()
+    if on_chunk is not None:
+        parts = []
+        for chunk in client.stream(messages, temperature=CHAT_TEMPERATURE, max_tokens=max_tokens):
+            parts.append(chunk)
+            on_chunk(chunk)
+        return "".join(parts)
+
+    response = client.post(messages, temperature=CHAT_TEMPERATURE, max_tokens=max_tokens)
+    if response.status_code != 200:
+        raise requests.HTTPError(f"API returned status {response.status_code}", response=response)
+    return response.json()["choices"][0]["message"]["content"]
+
+def request_completion(messages, on_chunk=None, max_tokens=CHAT_MAX_TOKENS):
+    """Call Groq through the circuit breaker, retrying 429/5xx with backoff.
+
+    Raises CircuitOpen without calling Groq while the circuit is open, and
+    the last error once retries are used up.
+    """
+    deadline = time.monotonic() + GROQ_RETRY_BUDGET
+    streamed = []
+
+    def forward(chunk):
+        streamed.append(chunk)
+        on_chunk(chunk)
+
+    attempt = 0
+    while True:
+        if not groq_breaker.allow():
+            raise CircuitOpen("Groq circuit is open")
+
+        started = time.perf_counter()
+        try:
+            if on_chunk is not None:
+                result = call_groq(messages, forward, max_tokens)
+            elif GROQ_HEDGE_PERCENTILE and len(groq_latency) >= HEDGE_MIN_SAMPLES:
+                result, hedged = hedge(lambda: call_groq(messages, max_tokens=max_tokens),
+                                       groq_latency.percentile(GROQ_HEDGE_PERCENTILE))
+                if hedged:
+                    hedged_requests.inc()
+            else:
+                result = call_groq(messages, max_tokens=max_tokens)
+        except (requests.RequestException, ValueError, KeyError, IndexError) as e:
+            response = getattr(e, 'response', None)
+            status = response.status_code if response is not None else None
+            # Client errors (bad request, auth) say nothing about Groq's health
+            upstream_fault = status is None or status in RETRYABLE_STATUS or status >= 500
+            groq_breaker.record(not upstream_fault, time.perf_counter() - started)
+
+            retryable = status in RETRYABLE_STATUS or isinstance(e, requests.ConnectionError)
+            # A stream can't be retried once the user has seen part of it
+            if not retryable or streamed or attempt >= GROQ_MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt, retry_after=retry_after_seconds(response))
+            if time.monotonic() + delay > deadline:
+                raise
+            upstream_retries.inc(reason=str(status) if status else type(e).__name__)
+            print(f"Groq call failed ({status or type(e).__name__}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+            attempt += 1
+            continue
+        except Exception:
+            # Anything else (a malformed payload, a failing on_chunk) still
+            # counts as a failed call, so a half-open trial slot is released
+            groq_breaker.record(False, time.perf_counter() - started)
+            raise
+
+        duration = time.perf_counter() - started
+        groq_breaker.record(True, duration)
+        if on_chunk is None:
+            groq_latency.add(duration)
+        return result
+
+# Replies from chat_with_groq that are error messages rather than answers
+CHAT_ERROR_PREFIXES = ("Error", "Unexpected error", "Groq API key not configured", "Please provide a valid question")
+
+def chat_with_groq(prompt, on_chunk=None, fallback=None, context=None, max_tokens=CHAT_MAX_TOKENS):
+    """Simple, direct implementation of chat functionality.
+
+    When on_chunk is given the completion is streamed and on_chunk is called
+    with each piece of text as it arrives; the full text is still returned.
+    `context` is earlier conversation (messages) sent before the prompt, and
+    max_tokens caps the length of the answer.
+    Successful answers are cached and identical in-flight prompts share one request.
+    While the Groq circuit is open, `fallback` (or a generic notice) is returned at once;
+    `fallback` is also the answer when Groq still fails after the retries.
+    """
     if not api_key:
         return "Groq API key not configured. Please check your environment variables."
 
     if not isinstance(prompt, str) or not prompt.strip():
         return "Please provide a valid question."
 
-    try:
-        url = "https://api.groq.com/openai/v1/chat/completions"
-        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-        data = {
-            "model": "llama3-8b-8192",
-            "messages": [
-                {"role": "system", "content": "You are a helpful healthcare assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.5,
-            "max_tokens": 200
-        }
+    started = time.perf_counter()
 
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        
-        if response.status_code != 200:
-            return f"Error: API returned status {response.status_code}"
+    def observe(outcome, status=''):
+        chat_latency.observe(time.perf_counter() - started, outcome=outcome, status=status)
 
-        try:
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
-        except (KeyError, IndexError):
-            return "Error: Invalid response format"
-        except Exception as e:
-            return f"Error parsing response: {str(e)}"
+    context = context or []
+    # Follow-ups are only the same question in the same conversation
+    key = make_key("\n".join([m['content'] for m in context] + [prompt]), GROQ_MODEL, CHAT_TEMPERATURE)
+    cached = response_cache.get(key)
+    if cached is not None:
+        if on_chunk is not None:
+            on_chunk(cached)
+        observe('cache_hit')
+        return cached
+
+    messages = [{"role": "system", "content": CHAT_SYSTEM_PROMPT}] + context + [
+        {"role": "user", "content": prompt}
+    ]
+
+    def fetch():
+        result = request_completion(messages, on_chunk, max_tokens)
+        response_cache.set(key, result)
+        return result
 
+    try:
+        result, shared = inflight_requests.do(key, fetch)
+        # Followers of a streamed request get the whole answer as one chunk
+        if shared and on_chunk is not None:
+            on_chunk(result)
+        observe('shared' if shared else 'ok', 200)
+        return result
+
+    except CircuitOpen:
+        observe('circuit_open')
+        fallback = fallback or GENERAL_FALLBACK
     except requests.Timeout:
-        return "Error: Request timed out"
+        observe('timeout')
+        error = "Error: Request timed out"
+    except requests.HTTPError as e:
+        observe('http_error', e.response.status_code)
+        error = f"Error: API returned status {e.response.status_code}"
+    except (ValueError, KeyError, IndexError):
+        observe('invalid_response')
+        error = "Error: Invalid response format"
     except requests.RequestException as e:
-        return f"Error making request: {str(e)}"
+        observe('request_error')
+        error = f"Error making request: {str(e)}"
     except Exception as e:
+        observe('error')
         return f"Unexpected error: {str(e)}"
 
+    # Groq is down or gave up on us: callers with local advice get that instead of the error
+    if fallback is None:
+        return error
+    if on_chunk is not None:
+        on_chunk(fallback)
+    return fallback
+
+def summarize_conversation(previous, turns):
+    """Rolling summary for the chat memory; the local digest unless CHAT_MEMORY_SUMMARY=llm"""
+    if CHAT_MEMORY_SUMMARY != 'llm':
+        return local_summary(previous, turns)
+    transcript = [f"Earlier summary: {previous}"] if previous else []
+    for user, assistant, _ in turns:
+        transcript.append(f"Patient: {user}\nAssistant: {assistant}")
+    # Raises CircuitOpen / request errors; the store falls back to the local digest
+    return request_completion([
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": "\n\n".join(transcript)}
+    ])
+
+def chat_turn(conversation_key, message, on_chunk=None):
+    """Answer a chat message in the context of the conversation so far"""
+    response = chat_with_groq(message, on_chunk=on_chunk, context=conversations.context(conversation_key))
+    # Only real answers become context; errors and outage notices don't
+    if not response.startswith(CHAT_ERROR_PREFIXES) and response != GENERAL_FALLBACK:
+        if conversations.add(conversation_key, message, response):
+            compact_conversation(conversation_key)
+    return response
+
+def compact_conversation(conversation_key):
+    """Summarize the conversation's older turns in a pool job of its own.
+
+    The summary may be another Groq call, so it must not hold up the reply.
+    Queued under the conversation key, so compactions of one conversation
+    run one after another.
+    """
+    try:
+        llm_pool.submit(conversation_key, conversations.compact, conversation_key)
+    except QueueFull:
+        # Still over budget, so the next turn tries again
+        print(f"Chat memory compaction for {conversation_key} skipped: pool is full")
+
 # ================== Authentication Routes ==================
-@app.route('/')
 def home():
     return render_template('index.html')
 
-@app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -116,97 +638,265 @@ def login():
 
     return render_template('login.html')
 
-@app.route('/patient-dashboard')
 def patient_dashboard():
     if 'user' not in session or session['user']['role'] != 'patient':
         return redirect(url_for('login'))
     return render_template('index2.html')
 
-@app.route('/chatbot')
 def chatbot():
     return render_template('chatbot.html')
 
-@app.route('/doctor-interface')
 def doctor_interface():
     if 'user' not in session or session['user']['role'] != 'doctor':
         return redirect(url_for('login'))
     return render_template('index3.html')
 
-@app.route('/logout')
 def logout():
+    if 'user' in session:
+        conversations.clear(f"user:{session['user']['username']}")
     session.pop('user', None)
     return redirect(url_for('home'))
 
+def register_pages(app):
+    """Login and the HTML pages, under their own endpoint names (url_for('login'))"""
+    app.add_url_rule('/', view_func=home)
+    app.add_url_rule('/login', view_func=login, methods=['GET', 'POST'])
+    app.add_url_rule('/patient-dashboard', view_func=patient_dashboard)
+    app.add_url_rule('/chatbot', view_func=chatbot)
+    app.add_url_rule('/doctor-interface', view_func=doctor_interface)
+    app.add_url_rule('/logout', view_func=logout)
+
 # ================== File Upload API ==================
-@app.route('/api/upload', methods=['POST'])
+uploads_api = Blueprint('uploads', __name__)
+
+class UploadRequest(Request):
+    """Files posted to the uploads API are parsed straight into the blob store's
+    temp directory, hashed and size-checked as they arrive, instead of being
+    spooled by Werkzeug first and copied afterwards"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.blueprint == uploads_api.name:
+            return blob_store.writer()
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+@uploads_api.route('/api/upload', methods=['POST'])
 def upload_file():
     if 'user' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    if 'file' not in request.files:
+    # Parsing the form is where the file is received and stored
+    try:
+        files = request.files
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+
+    if 'file' not in files:
         return jsonify({'error': 'No file part'}), 400
         
-    file = request.files['file']
+    file = files['file']
     
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
         
     if file and allowed_file(file.filename):
-        # Generate a unique filename
         filename = secure_filename(file.filename)
-        unique_id = str(uuid.uuid4())
-        timestamp = int(time.time())
-        unique_filename = f"{timestamp}_{unique_id}_{filename}"
-        
-        # Save the file
-        filepath = os.path.join(UPLOAD_FOLDER, unique_filename)
-        file.save(filepath)
+        file_type = file.filename.rsplit('.', 1)[1].lower()
+
+        # Already on disk and hashed; file it under its content hash, so
+        # identical bytes share one blob
+        if isinstance(file.stream, BlobWriter):
+            blob = blob_store.commit(file.stream, file_type)
+        else:
+            try:
+                blob = blob_store.save(file.stream, file_type)
+            except UploadTooLarge as e:
+                return jsonify({'error': str(e)}), 413
         
         # Create file record
         file_record = {
-            'id': unique_id,
+            'id': str(uuid.uuid4()),
             'original_name': filename,
-            'filename': unique_filename,
-            'path': filepath,
+            'filename': blob['filename'],
+            'path': blob_store.path(blob['filename']),
+            'sha256': blob['sha256'],
+            'size': blob['size'],
             'uploaded_by': session['user']['username'],
             'upload_date': datetime.now().isoformat(),
-            'file_type': filename.rsplit('.', 1)[1].lower(),
+            'file_type': file_type,
             'description': request.form.get('description', ''),
-            'category': request.form.get('category', 'Other')
+            'category': request.form.get('category', 'Other'),
+            'preview': None
         }
         
+        # Build the search index first: on first use it queues every record it
+        # hasn't indexed, and this one is submitted below with its callback
+        file_search.resolve()
+
         # Add to shared files
-        shared_files.append(file_record)
+        file_record = file_index.add(file_record)
+
+        # Render a preview after the response; the record is updated when it's ready
+        rooms = uploader_rooms(session['user'])
+        file_id = file_record['id']
+        preview_pipeline.submit(file_record['path'], blob['sha256'], file_type,
+                                on_done=lambda name: preview_ready(file_id, name, rooms))
+        # Same for text extraction and search indexing
+        file_search.submit(file_record,
+                           on_done=lambda file_id: broadcaster.publish('file_indexed', {'id': file_id},
+                                                                       rooms, key=file_id))
         
-        # Notify all connected clients about the new file
-        socketio.emit('new_file_uploaded', file_record, broadcast=True)
+        # Notify the clients this file is shared with
+        broadcaster.publish('new_file_uploaded', file_record, rooms, key=file_record['id'])
         
         return jsonify({'success': True, 'file': file_record}), 200
     else:
         return jsonify({'error': 'File type not allowed'}), 400
 
-@app.route('/api/files')
+def preview_ready(file_id, preview_name, rooms):
+    file_record = file_index.get(file_id)
+    if file_record is None:
+        return
+    # Re-adding bumps the record's seq so incremental /api/files sync picks it up
+    file_index.add(dict(file_record, preview=preview_name))
+    broadcaster.publish('file_preview_ready', {'id': file_id, 'preview': preview_name},
+                        rooms, key=file_id)
+
+@uploads_api.app_errorhandler(413)
+def upload_too_large(e):
+    return jsonify({'error': f"File exceeds the {MAX_UPLOAD_BYTES} byte limit"}), 413
+
+@uploads_api.route('/api/files/gc', methods=['POST'])
+def collect_file_garbage():
+    """Delete stored blobs that no file record references"""
+    if 'user' not in session or session['user']['role'] != 'doctor':
+        return jsonify({'error': 'Not authorized'}), 403
+
+    referenced = {record['filename'] for record in file_index.all()}
+    removed, freed = blob_store.gc(referenced)
+    return jsonify({'success': True, 'removed': removed, 'freed_bytes': freed}), 200
+
+@uploads_api.route('/api/files')
 def get_files():
     if 'user' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
-        
-    return jsonify({'files': shared_files}), 200
 
-@app.route('/uploads/<filename>')
+    # Incremental sync: only records changed after `since` (or the page `cursor`)
+    args = request.args
+    try:
+        since = max(int(args.get('since', 0)), int(args.get('cursor', 0)))
+        limit = page_limit(args, 100, 500)
+    except ValueError:
+        return jsonify({'error': 'Invalid since, cursor or limit'}), 400
+
+    file_index.sync()
+    etag = make_etag('files', file_index.last_seq, sorted(args.items(multi=True)))
+
+    def build_payload():
+        files, cursor, has_more = file_index.changes(
+            since=since,
+            category=args.get('category'),
+            uploaded_by=args.get('uploaded_by'),
+            limit=limit
+        )
+        return {
+            'files': files,
+            'cursor': cursor,
+            'next_cursor': cursor if has_more else None
+        }
+
+    return conditional_json(etag, build_payload, compress=True)
+
+@uploads_api.route('/api/files/search')
+def search_files():
+    """Files whose name, description, category, upload month or text match ?q=, best first"""
+    if 'user' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing q'}), 400
+    try:
+        limit = page_limit(request.args, 20, 100)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+
+    started = time.perf_counter()
+    results = []
+    for file_id, score, snippet in file_search.search(query, limit=limit):
+        file_record = file_index.get(file_id)
+        if file_record is not None:
+            results.append(dict(file_record, score=score, snippet=snippet))
+    return jsonify({
+        'results': results,
+        'count': len(results),
+        'took_ms': round((time.perf_counter() - started) * 1000, 2)
+    }), 200
+
+@uploads_api.route('/uploads/<filename>')
 def uploaded_file(filename):
     if 'user' not in session:
         return redirect(url_for('login'))
         
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    return send_stored_file(UPLOAD_FOLDER, filename)
+
+@uploads_api.route('/previews/<filename>')
+def preview_file(filename):
+    if 'user' not in session:
+        return redirect(url_for('login'))
+
+    return send_stored_file(PREVIEW_FOLDER, filename)
+
+def send_stored_file(directory, filename):
+    """Serve a file with Range support and validators.
+
+    Blobs named by their SHA-256 get that hash as a strong ETag and are cached
+    as immutable; anything else falls back to Flask's default validators.
+    """
+    content_addressed = BLOB_NAME.match(filename) is not None
+    response = send_from_directory(
+        directory, filename,
+        conditional=True,
+        etag=filename.split('.', 1)[0] if content_addressed else True,
+        max_age=IMMUTABLE_MAX_AGE if content_addressed else None
+    )
+    # Medical documents may be cached by the browser but never by shared proxies
+    response.cache_control.public = False
+    response.cache_control.private = True
+    if content_addressed:
+        response.cache_control.immutable = True
+    return response
 
 # ================== Appointment API ==================
-@app.route('/api/appointments', methods=['GET', 'POST'])
+appointments_api = Blueprint('appointments', __name__)
+
+# New appointments are pending until a doctor sets one of the others
+APPOINTMENT_STATUSES = ('pending', 'confirmed', 'completed', 'cancelled')
+
+def appointment_problem(data):
+    """What is wrong with a new appointment's fields, or None; date is YYYY-MM-DD and time HH:MM"""
+    for field, fmt, expected in (('date', '%Y-%m-%d', 'YYYY-MM-DD'), ('time', '%H:%M', 'HH:MM')):
+        value = data.get(field)
+        try:
+            datetime.strptime(value, fmt)
+        except (TypeError, ValueError):
+            return f"Invalid {field}: expected {expected}"
+    for field in ('doctor', 'reason'):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return f"Invalid {field}"
+    return None
+
+@appointments_api.route('/api/appointments', methods=['GET', 'POST'])
 def handle_appointments():
     if 'user' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
     if request.method == 'POST':
-        data = request.json
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Expected a JSON object'}), 400
+        problem = appointment_problem(data)
+        if problem:
+            return jsonify({'error': problem}), 400
         
         # Create appointment
         appointment = {
@@ -220,55 +910,80 @@ def handle_appointments():
             'created_at': datetime.now().isoformat()
         }
         
-        appointments.append(appointment)
+        appointment = appointment_store.add(appointment)
         
-        # Notify all connected clients about the new appointment
-        socketio.emit('new_appointment', appointment, broadcast=True)
+        # Notify the patient and the doctors
+        broadcaster.publish('new_appointment', appointment,
+                            care_team_rooms(appointment['patient']), key=appointment['id'])
         
         return jsonify({'success': True, 'appointment': appointment}), 200
     
-    # For GET requests
-    return jsonify({'appointments': appointments}), 200
+    # For GET requests: filtered, paginated and conditional on the store version
+    args = request.args
+    try:
+        limit = page_limit(args, 100, 500)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+
+    appointment_store.sync()
+    etag = make_etag('appointments', appointment_store.version, sorted(args.items(multi=True)))
 
-@app.route('/api/appointments/<appointment_id>', methods=['PUT'])
+    def build_payload():
+        page, next_cursor = appointment_store.query(
+            doctor=args.get('doctor'),
+            date_from=args.get('from'),
+            date_to=args.get('to'),
+            status=args.get('status'),
+            cursor=args.get('cursor'),
+            limit=limit
+        )
+        return {'appointments': page, 'next_cursor': next_cursor}
+
+    try:
+        return conditional_json(etag, build_payload)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@appointments_api.route('/api/appointments/<appointment_id>', methods=['PUT'])
 def update_appointment(appointment_id):
     if 'user' not in session or session['user']['role'] != 'doctor':
         return jsonify({'error': 'Not authorized'}), 403
     
-    data = request.json
-    
-    # Find appointment
-    for appointment in appointments:
-        if appointment['id'] == appointment_id:
-            appointment['status'] = data.get('status')
-            appointment['updated_at'] = datetime.now().isoformat()
-            
-            # Notify all connected clients about the updated appointment
-            socketio.emit('appointment_updated', appointment, broadcast=True)
-            
-            return jsonify({'success': True, 'appointment': appointment}), 200
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    if data.get('status') not in APPOINTMENT_STATUSES:
+        return jsonify({'error': f"Invalid status: expected one of {', '.join(APPOINTMENT_STATUSES)}"}), 400
     
-    return jsonify({'error': 'Appointment not found'}), 404
+    appointment = appointment_store.update(
+        appointment_id,
+        status=data.get('status'),
+        updated_at=datetime.now().isoformat()
+    )
+    if appointment is None:
+        return jsonify({'error': 'Appointment not found'}), 404
 
-# ================== Chatbot Functionality ==================
-def save_to_json(data, filename):
-    """Save data to a JSON file with timestamp"""
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    filepath = os.path.join(DATA_DIR, f"{filename}_{timestamp}.json")
-    
-    try:
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
-        print(f"Data saved to {filepath}")
-        return True
-    except Exception as e:
-        print(f"Error saving data: {str(e)}")
-        return False
+    # Notify the patient and the doctors
+    broadcaster.publish('appointment_updated', appointment,
+                        care_team_rooms(appointment['patient']), key=appointment['id'])
 
+    return jsonify({'success': True, 'appointment': appointment}), 200
+
+# ================== Chatbot Functionality ==================
 @socketio.on('connect')
-def handle_connect():
+@timed_event('connect')
+def handle_connect(auth=None):
     print('Client connected')
-    socketio.emit('bot_response', {
+    connected_sockets.inc()
+
+    # Join the rooms this user receives targeted updates in
+    user = session.get('user')
+    if user:
+        join_room(f"role:{user['role']}")
+        if user['role'] == 'patient':
+            join_room(patient_room(user['username']))
+
+    emit('bot_response', {
         'response': "Hello! I'm your HealthSync Assistant. How can I help you today? You can ask about:\n\n" +
                    "• General health questions\n" +
                    "• Diabetes monitoring\n" +
@@ -278,213 +993,411 @@ def handle_connect():
     })
 
 @socketio.on('disconnect')
-def handle_disconnect():
+@timed_event('disconnect')
+def handle_disconnect(*args):
     print('Client disconnected')
+    connected_sockets.dec()
+    # Workers that never ran an LLM job have nothing to cancel
+    if llm_pool.built:
+        llm_pool.cancel_session(request.sid)
+    # Anonymous conversations can't be resumed
+    conversations.clear(f"sid:{request.sid}")
+
+def llm_priority(high=False):
+    """Analyses and doctors' requests go in the high-priority lane"""
+    user = session.get('user')
+    if high or (user and user['role'] == 'doctor'):
+        return HIGH
+    return NORMAL
 
-@socketio.on('user_message')
+def caller_key():
+    """Who a request counts against: the logged-in user, else the socket"""
+    user = session.get('user')
+    return f"user:{user['username']}" if user else f"sid:{request.sid}"
+
+def submit_llm_job(event, fn, *args, stream=False, priority=NORMAL, tokens=0):
+    """Run fn in the LLM pool and emit its result to the requesting session.
+
+    With stream=True, fn is passed an on_chunk callback and every chunk is
+    forwarded as a bot_response_chunk event, followed by bot_response_end
+    carrying the full text. The request is first charged `tokens` (estimated)
+    against the caller's and the global rate limits; if it doesn't fit, the
+    client gets a rate_limited event saying when to retry. A job that is
+    refused or dropped from the queue unrun gets its charge refunded and a
+    busy reply on its own event.
+    """
+    sid = request.sid
+    key = caller_key()
+    throttled = rate_limiter.acquire(key, tokens, priority)
+    if throttled is not None:
+        rate_limited.inc(scope=throttled.scope, limit=throttled.limit)
+        details = throttled.to_dict()
+        emit('rate_limited', dict(details, event=event))
+        emit(event, {'response': RATE_LIMITED_MESSAGE, 'busy': True, 'retry_after': details['retry_after']})
+        return False
+
+    def job():
+        if not stream:
+            socketio.emit(event, {'response': fn(*args)}, to=sid)
+            return
+
+        stream_id = str(uuid.uuid4())
+        index = 0
+
+        def on_chunk(chunk):
+            nonlocal index
+            socketio.emit('bot_response_chunk', {
+                'stream_id': stream_id,
+                'event': event,
+                'index': index,
+                'chunk': chunk
+            }, to=sid)
+            index += 1
+
+        response = fn(*args, on_chunk=on_chunk)
+        socketio.emit('bot_response_end', {
+            'stream_id': stream_id,
+            'event': event,
+            'chunks': index,
+            'response': response
+        }, to=sid)
+
+    # What to tell the client and give back if the job is dropped unrun
+    job.event, job.caller, job.tokens = event, key, tokens
+
+    # Acknowledge before queueing, so a fast job (a cache hit, a fallback)
+    # can't answer ahead of it; the result follows when the worker finishes
+    emit('bot_thinking', {'status': 'thinking'})
+
+    try:
+        dropped = llm_pool.submit(sid, job, priority=priority)
+    except QueueFull:
+        rate_limiter.refund(key, tokens)
+        emit(event, {'response': BUSY_MESSAGE, 'busy': True})
+        return False
+
+    if dropped is not None:
+        # drop_oldest policy: this session's oldest queued request made room for this one
+        dropped_job = dropped[0]
+        rate_limiter.refund(dropped_job.caller, dropped_job.tokens)
+        emit(dropped_job.event, {'response': BUSY_MESSAGE, 'busy': True, 'dropped': True})
+    return True
+
+@timed_event('user_message')
 def handle_message(data):
     message = data.get('message', '').lower().strip()
     print(f"Received message: {message}")
     
     if not message:
-        socketio.emit('bot_response', {'response': "Please send a message."})
+        emit('bot_response', {'response': "Please send a message."})
         return
 
     if message in ['sugar', 'diabetes']:
         emit('message', {'response': 'Starting diabetes monitoring. Please answer the following questions:'})
         emit('start_questions', {
             'type': 'diabetes',
-            'questions': [
-                "What is your current blood sugar level (mg/dL)?",
-                "Is this a fasting reading or post-meal? (fasting/post)",
-                "Have you taken your medication today? (yes/no)",
-                "Did you consume any sugary or high-carb food today? (yes/no)",
-                "Have you exercised today? (yes/no)",
-                "How many hours did you sleep last night?",
-                "Do you feel any symptoms like fatigue, thirst, or blurred vision? (yes/no)",
-                "Did you monitor your sugar level at the same time as yesterday? (yes/no)"
-            ]
+            'questions': DIABETES.questions
         })
     elif message in ['hypertension', 'blood pressure']:
         emit('message', {'response': 'Starting blood pressure monitoring. Please answer the following questions:'})
         emit('start_questions', {
             'type': 'hypertension',
-            'questions': [
-                "What is your systolic blood pressure (upper number)?",
-                "What is your diastolic blood pressure (lower number)?",
-                "Have you experienced any dizziness or headaches? (yes/no)",
-                "Have you taken hypertension medication? (yes/no)",
-                "Did you exercise today? (yes/no)",
-                "How many hours did you sleep last night?",
-                "Have you been feeling stressed lately? (yes/no)",
-                "Did you consume salty or processed foods today? (yes/no)",
-                "How much water have you consumed today? (in liters)"
-            ]
+            'questions': HYPERTENSION.questions
         })
     else:
         # Use Groq for general health questions
-        response = chat_with_groq(message)
-        socketio.emit('bot_response', {'response': response})
+        key = caller_key()
+        submit_llm_job('bot_response', chat_turn, key, message,
+                       stream=data.get('stream', STREAM_RESPONSES),
+                       priority=llm_priority(),
+                       tokens=estimate_tokens(CHAT_SYSTEM_PROMPT + message) + conversations.context_tokens(key)
+                       + CHAT_MAX_TOKENS)
 
-@socketio.on('analyze_data')
+@timed_event('analyze_data')
 def analyze_data(data):
     data_type = data.get('type')
     answers = data.get('answers')
+    stream = data.get('stream', STREAM_RESPONSES)
     
+    # Parse and validate once; everything after this works on the typed reading
     if data_type == 'diabetes':
-        analysis = analyze_diabetes(answers)
+        schema, record, analyze, label = DIABETES, record_diabetes_reading, analyze_diabetes, 'diabetes'
     elif data_type == 'hypertension':
-        analysis = analyze_hypertension(answers)
+        schema, record, analyze, label = HYPERTENSION, record_hypertension_reading, analyze_hypertension, 'hypertension'
     else:
-        analysis = "Invalid data type for analysis"
-    
-    emit('message', {'response': analysis})
-    
-@socketio.on('request_latest_readings')
+        emit('message', {'response': "Invalid data type for analysis"})
+        return
+
+    try:
+        reading = schema.parse(answers)
+    except SchemaError as e:
+        emit('message', {'response': f"Error analyzing {label} data: {str(e)}"})
+        return
+
+    # Classify and publish the reading right away; the narrative follows from the pool
+    record(reading)
+    template = get_template(data_type, choose_variant(PROMPT_VARIANT, caller_key()))
+    submit_llm_job('message', analyze, reading, template, stream=stream,
+                   priority=llm_priority(high=True), tokens=template.estimated_tokens())
+
+@timed_event('request_latest_readings')
 def handle_request_latest_readings():
     """Handle requests for latest readings and emit updates"""
-    emit('readings_update', latest_readings)
+    emit('readings_update', get_latest_readings_view())
+
+def publish_triage():
+    """Fold in new readings and push the top of the triage list to doctors if it changed"""
+    global last_triage_top
+    triage_index.sync(reading_store)
+    top = triage_index.top(TRIAGE_PUSH_SIZE)
+    if top != last_triage_top:
+        last_triage_top = top
+        broadcaster.publish('triage_update', {'patients': top}, {DOCTORS_ROOM}, key='triage')
+
+def record_diabetes_reading(glucose):
+    """Classify a glucose reading locally and publish it to the dashboards"""
+    kind = glucose.reading_type or 'post'
+    category, risk_level = classify_glucose(glucose.sugar_level, kind == 'fasting')
+
+    reading = reading_store.add(current_username(), 'diabetes', glucose.sugar_level,
+                                category=category, risk_level=risk_level,
+                                data={'reading_type': kind})
+    view = latest_reading_view(reading)
+    state_backend.put('latest_readings', 'diabetes', view)
+    trend_tracker.sync(reading_store)
+
+    # Send only what changed, to the patient and the doctors
+    broadcaster.publish('readings_update', {'diabetes': view}, care_team_rooms(reading['patient']))
+    publish_triage()
+    return view
+
+def record_hypertension_reading(bp):
+    """Classify a blood pressure reading locally and publish it to the dashboards"""
+    category, risk_level = classify_bp(bp.systolic, bp.diastolic)
 
-def analyze_diabetes(answers):
+    reading = reading_store.add(current_username(), 'hypertension', bp.systolic, bp.diastolic,
+                                category=category, risk_level=risk_level)
+    view = latest_reading_view(reading)
+    state_backend.put('latest_readings', 'hypertension', view)
+    trend_tracker.sync(reading_store)
+
+    # Send only what changed, to the patient and the doctors
+    broadcaster.publish('readings_update', {'hypertension': view}, care_team_rooms(reading['patient']))
+    publish_triage()
+    return view
+
+def run_analysis(template, reading, fallback, on_chunk=None):
+    """Render the template for a reading, ask Groq and log the estimated token use"""
+    started = time.perf_counter()
+    prompt = template.render(reading)
+    response = chat_with_groq(prompt, on_chunk=on_chunk, fallback=fallback, max_tokens=template.max_tokens)
+    elapsed = time.perf_counter() - started
+
+    sent, received = estimate_tokens(prompt), estimate_tokens(response)
+    prompt_tokens.inc(sent, template=template.id)
+    completion_tokens.inc(received, template=template.id)
+    analysis_latency.observe(elapsed, template=template.id)
+    print(f"Analysis {template.id}: {sent} prompt + {received} completion tokens (est.) in {elapsed:.2f}s")
+    return response
+
+def analyze_diabetes(reading, template, on_chunk=None):
     try:
-        # Format the answers into a structured prompt for Groq
-        sugar_level = answers.get("What is your current blood sugar level (mg/dL)?", "")
-        is_fasting = answers.get("Is this a fasting reading or post-meal? (fasting/post)", "")
-        took_medication = answers.get("Have you taken your medication today? (yes/no)", "")
-        high_carb_food = answers.get("Did you consume any sugary or high-carb food today? (yes/no)", "")
-        exercised = answers.get("Have you exercised today? (yes/no)", "")
-        sleep_hours = answers.get("How many hours did you sleep last night?", "")
-        has_symptoms = answers.get("Do you feel any symptoms like fatigue, thirst, or blurred vision? (yes/no)", "")
-        same_time = answers.get("Did you monitor your sugar level at the same time as yesterday? (yes/no)", "")
-
-        prompt = f"""As a healthcare AI assistant, analyze the following diabetes monitoring data and provide a detailed assessment with recommendations:
-
-Blood Sugar Reading:
-- Current Level: {sugar_level} mg/dL
-- Reading Type: {is_fasting}
-- Taken at same time as yesterday: {same_time}
-
-Lifestyle Factors:
-- Medication taken: {took_medication}
-- High-carb food consumed: {high_carb_food}
-- Exercise today: {exercised}
-- Sleep hours: {sleep_hours}
-- Symptoms present: {has_symptoms}
-
-Please provide:
-1. Analysis of blood sugar level (including whether it's in normal, pre-diabetic, or diabetic range)
-2. Risk assessment
-3. Specific recommendations based on the lifestyle factors
-4. Any warning signs that need immediate attention
-5. Tips for better management
-
-Format the response with appropriate emoji indicators:
-⚠️ for warnings
-✅ for normal/good readings
-ℹ️ for informational points
-🎯 for targets
-📝 for recommendations"""
+        # Local summary to answer with if Groq is unavailable
+        kind = reading.reading_type or 'post'
+        category, risk_level = classify_glucose(reading.sugar_level, kind == 'fasting')
+        fallback = diabetes_fallback(reading.sugar_level, kind, category, risk_level)
 
         # Get analysis from Groq
-        analysis = chat_with_groq(prompt)
-        
-        # Save the reading
-        risk_level = "medium"  # Default risk level
-        if "critical" in analysis.lower() or "immediate attention" in analysis.lower():
-            risk_level = "high"
-        elif "normal range" in analysis.lower() and "good" in analysis.lower():
-            risk_level = "low"
-            
-        latest_readings['diabetes'] = {
-            'value': float(sugar_level),
-            'timestamp': datetime.now().isoformat(),
-            'risk_level': risk_level
-        }
-        
-        # After saving the reading, emit an update to all connected clients
-        socketio.emit('readings_update', latest_readings, broadcast=True)
-        
-        return analysis
+        return run_analysis(template, reading, fallback, on_chunk)
 
     except Exception as e:
         return f"Error analyzing diabetes data: {str(e)}"
 
-def analyze_hypertension(answers):
+def analyze_hypertension(reading, template, on_chunk=None):
     try:
-        # Format the answers into a structured prompt for Groq
-        systolic = answers.get("What is your systolic blood pressure (upper number)?", "")
-        diastolic = answers.get("What is your diastolic blood pressure (lower number)?", "")
-        has_symptoms = answers.get("Have you experienced any dizziness or headaches? (yes/no)", "")
-        took_medication = answers.get("Have you taken hypertension medication? (yes/no)", "")
-        exercised = answers.get("Did you exercise today? (yes/no)", "")
-        sleep_hours = answers.get("How many hours did you sleep last night?", "")
-        is_stressed = answers.get("Have you been feeling stressed lately? (yes/no)", "")
-        salty_food = answers.get("Did you consume salty or processed foods today? (yes/no)", "")
-        water_intake = answers.get("How much water have you consumed today? (in liters)", "")
-
-        prompt = f"""As a healthcare AI assistant, analyze the following blood pressure monitoring data and provide a detailed assessment with recommendations:
-
-Blood Pressure Reading:
-- Systolic (upper number): {systolic} mmHg
-- Diastolic (lower number): {diastolic} mmHg
-
-Current Symptoms and Lifestyle Factors:
-- Experiencing dizziness/headaches: {has_symptoms}
-- Medication taken: {took_medication}
-- Exercise today: {exercised}
-- Sleep hours: {sleep_hours}
-- Stress level: {is_stressed}
-- Salty/processed food intake: {salty_food}
-- Water consumption: {water_intake} liters
-
-Please provide:
-1. Analysis of blood pressure (categorize as normal, elevated, Stage 1, Stage 2, or Crisis)
-2. Risk assessment
-3. Evaluation of lifestyle factors' impact
-4. Urgent warnings if needed
-5. Specific recommendations for improvement
-6. Hydration and dietary advice
-7. Stress management suggestions if needed
-
-Format the response with appropriate emoji indicators:
-🚨 for critical/emergency situations
-⚠️ for warnings
-✅ for normal/good readings
-ℹ️ for informational points
-🎯 for targets
-📝 for recommendations
-💧 for hydration advice
-🧘‍♀️ for stress management tips"""
+        # Local summary to answer with if Groq is unavailable
+        category, risk_level = classify_bp(reading.systolic, reading.diastolic)
+        fallback = hypertension_fallback(reading.systolic, reading.diastolic, category, risk_level)
 
         # Get analysis from Groq
-        analysis = chat_with_groq(prompt)
-        
-        # Save the reading
-        risk_level = "medium"  # Default risk level
-        if "crisis" in analysis.lower() or "emergency" in analysis.lower() or "immediate" in analysis.lower():
-            risk_level = "critical"
-        elif "stage 2" in analysis.lower() or "severe" in analysis.lower():
-            risk_level = "high"
-        elif "normal" in analysis.lower() and "good" in analysis.lower():
-            risk_level = "low"
-            
-        latest_readings['hypertension'] = {
-            'value': f"{systolic}/{diastolic}",
-            'timestamp': datetime.now().isoformat(),
-            'risk_level': risk_level
-        }
-        
-        # After saving the reading, emit an update to all connected clients
-        socketio.emit('readings_update', latest_readings, broadcast=True)
-        
-        return analysis
+        return run_analysis(template, reading, fallback, on_chunk)
 
     except Exception as e:
         return f"Error analyzing hypertension data: {str(e)}"
 
-@app.route('/api/latest_readings')
+# ================== Readings API ==================
+readings_api = Blueprint('readings', __name__)
+
+@readings_api.route('/api/latest_readings')
 def get_latest_readings():
-    return jsonify(latest_readings)
+    return jsonify(get_latest_readings_view())
+
+@readings_api.route('/api/readings')
+def get_readings():
+    """Reading history with optional condition and time range filters"""
+    if 'user' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    # Patients only see their own history; doctors can ask for any patient
+    patient = session['user']['username']
+    if session['user']['role'] == 'doctor':
+        patient = request.args.get('patient') or None
+
+    try:
+        limit = page_limit(request.args, 500, 5000)
+        readings = reading_store.query(
+            patient=patient,
+            condition=request.args.get('condition'),
+            start=request.args.get('from'),
+            end=request.args.get('to'),
+            limit=limit,
+            descending=request.args.get('order') == 'desc'
+        )
+    except ValueError as e:
+        return jsonify({'error': f"Invalid query: {str(e)}"}), 400
+
+    return jsonify({'readings': readings, 'count': len(readings)}), 200
+
+@readings_api.route('/api/trends')
+def get_trends():
+    """Rolling 7- and 30-day statistics for a patient"""
+    if 'user' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    patient = session['user']['username']
+    if session['user']['role'] == 'doctor':
+        patient = request.args.get('patient', 'patient')
+
+    trend_tracker.sync(reading_store)
+    return jsonify(trend_tracker.summary(patient)), 200
+
+@readings_api.route('/api/triage')
+def get_triage():
+    """The ?limit= most urgent patients (default 10), for doctors"""
+    if 'user' not in session or session['user']['role'] != 'doctor':
+        return jsonify({'error': 'Not authorized'}), 403
+
+    try:
+        limit = page_limit(request.args, 10, 100)
+    except ValueError as e:
+        return jsonify({'error': f"Invalid query: {str(e)}"}), 400
+
+    triage_index.sync(reading_store)
+    return jsonify({'patients': triage_index.top(limit)}), 200
+
+# ================== Metrics Routes ==================
+monitoring = Blueprint('monitoring', __name__)
+
+@monitoring.route('/metrics')
+def get_metrics():
+    return registry.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
+@monitoring.route('/debug/profile')
+def get_profile():
+    """Sample all threads for ?seconds=N and return flame-graph-ready folded stacks"""
+    if not PROFILER_ENABLED:
+        return jsonify({'error': 'Profiler is disabled'}), 404
+    if 'user' not in session or session['user']['role'] != 'doctor':
+        return jsonify({'error': 'Not authorized'}), 403
+
+    try:
+        seconds = float(request.args.get('seconds', '10'))
+    except ValueError:
+        return jsonify({'error': 'Invalid seconds'}), 400
+    seconds = min(max(seconds, 0.1), PROFILER_MAX_SECONDS)
+
+    try:
+        folded = profiler.profile(seconds)
+    except ProfilerBusy as e:
+        return jsonify({'error': str(e)}), 409
+    return folded, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+# ================== App Factory ==================
+# HTTP routes and Socket.IO events per subsystem
+BLUEPRINTS = {
+    'uploads': uploads_api,
+    'appointments': appointments_api,
+    'readings': readings_api
+}
+SOCKET_EVENTS = {
+    'chatbot': {'user_message': handle_message, 'analyze_data': analyze_data},
+    'readings': {'request_latest_readings': handle_request_latest_readings}
+}
+
+def create_app(config=None):
+    """Build the Flask app and bind Socket.IO to it, with the chosen subsystems.
+
+    `config` goes into app.config and takes precedence over the environment
+    for everything read through setting() (see also load_settings()), e.g.
+    create_app({'DATA_DIR': tmp, 'SUBSYSTEMS': 'uploads,readings'}).
+    Nothing heavy happens here; services are built on their first request.
+    There is one app per process: Socket.IO and the services are module-level.
+    """
+    started = time.perf_counter()
+    settings.clear()
+    settings.update(config or {})
+    load_settings()
+
+    subsystems = setting('SUBSYSTEMS', ','.join(SUBSYSTEMS))
+    if isinstance(subsystems, str):
+        subsystems = [name.strip() for name in subsystems.split(',') if name.strip()]
+    unknown = set(subsystems) - set(SUBSYSTEMS)
+    if unknown:
+        raise ValueError(f"Unknown subsystems: {', '.join(sorted(unknown))}")
+
+    os.makedirs(setting('DATA_DIR', DATA_DIR), exist_ok=True)
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+    app = Flask(__name__)
+    app.request_class = UploadRequest
+    app.secret_key = 'GROQ_API_KEY'
+    # Leave room for the multipart framing around the file itself
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 64 * 1024
+    app.config['USE_X_SENDFILE'] = str(setting('USE_X_SENDFILE', 'false')).lower() == 'true'
+    app.config.update(settings)
+    app.config['SUBSYSTEMS'] = tuple(subsystems)
+    CORS(app)
+    socketio.init_app(app, cors_allowed_origins="*", message_queue=setting('SOCKETIO_MESSAGE_QUEUE'))
+
+    app.before_request(start_request_timer)
+    app.after_request(record_request_time)
+    register_pages(app)
+    app.register_blueprint(monitoring)
+    for name in subsystems:
+        if name in BLUEPRINTS:
+            app.register_blueprint(BLUEPRINTS[name])
+        # Registered after init_app, so they go to this app's Socket.IO server only
+        for event, handler in SOCKET_EVENTS.get(name, {}).items():
+            socketio.on_event(event, handler)
+
+    preload = setting('PRELOAD_SERVICES', '')
+    if isinstance(preload, str):
+        preload = list(services) if preload == 'all' else [name.strip() for name in preload.split(',') if name.strip()]
+    unknown = set(preload) - set(services)
+    if unknown:
+        raise ValueError(f"Unknown services: {', '.join(sorted(unknown))}")
+    if preload:
+        socketio.start_background_task(preload_services, preload)
+
+    print(f"App created with {', '.join(subsystems) or 'no subsystems'} "
+          f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return app
+
+def preload_services(names):
+    """Build services ahead of their first request; requests that need one meanwhile wait for it"""
+    for name in names:
+        try:
+            services[name].resolve()
+        except Exception as e:
+            print(f"Preloading {name} failed: {str(e)}")
+
+def __getattr__(name):
+    # `app.app` (gunicorn app:app, scripts) builds the default app on first access
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
+    app = create_app()
     socketio.run(app, debug=True, port=5000)
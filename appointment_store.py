@@ -0,0 +1,141 @@
+# appointment_store.py
+"""Indexed appointment store.
+
+Appointments are persisted in a StateBackend; each process keeps in-memory
+indexes over them and pulls other workers' changes before every read:
+
+    _by_id            id -> appointment                      O(1) lookups/updates
+    _by_doctor_date   (doctor, date) -> sorted [(time, id)]  doctor's daily view
+    _timeline         sorted [(date, time, id)]              date ranges + cursors
+
+`version` is the backend version the indexes reflect; callers use it for ETags.
+"""
+import base64
+import json
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+from state_backend import MemoryBackend
+
+COLLECTION = 'appointments'
+
+
+def _sort_key(appointment):
+    # Always strings, so a malformed stored record can't break the sorted indexes
+    return (str(appointment.get('date') or ''), str(appointment.get('time') or ''), str(appointment['id']))
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the sort key encoded in a cursor; raises ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = tuple(json.loads(base64.urlsafe_b64decode(padded)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if len(key) != 3 or not all(isinstance(part, str) for part in key):
+        raise ValueError("Invalid cursor")
+    return key
+
+
+class AppointmentStore:
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend()
+        self._by_id = {}
+        self._by_doctor_date = {}
+        self._timeline = []
+        self._lock = threading.RLock()
+        self.version = 0
+        self.sync()
+
+    def __len__(self):
+        self.sync()
+        return len(self._by_id)
+
+    def sync(self):
+        """Apply changes made through the backend (by any worker) since the last sync"""
+        with self._lock:
+            changes, version = self.backend.changes_since(COLLECTION, self.version)
+            for _, appointment in changes:
+                self._index(appointment)
+            self.version = version
+
+    def _index(self, appointment):
+        old = self._by_id.get(appointment['id'])
+        if old is not None:
+            old_key = _sort_key(old)
+            self._timeline.pop(bisect_left(self._timeline, old_key))
+            day = self._by_doctor_date[(old.get('doctor'), old_key[0])]
+            day.pop(bisect_left(day, old_key[1:]))
+
+        key = _sort_key(appointment)
+        self._by_id[appointment['id']] = appointment
+        insort(self._timeline, key)
+        insort(self._by_doctor_date.setdefault((appointment.get('doctor'), key[0]), []), key[1:])
+
+    def add(self, appointment):
+        with self._lock:
+            self.backend.put(COLLECTION, appointment['id'], appointment)
+            self.sync()
+            return self._by_id[appointment['id']]
+
+    def get(self, appointment_id):
+        self.sync()
+        return self._by_id.get(appointment_id)
+
+    def update(self, appointment_id, **changes):
+        """Apply changes to an appointment; returns it, or None if it doesn't exist"""
+        with self._lock:
+            self.sync()
+            appointment = self._by_id.get(appointment_id)
+            if appointment is None:
+                return None
+            self.backend.put(COLLECTION, appointment_id, dict(appointment, **changes))
+            self.sync()
+            return self._by_id[appointment_id]
+
+    def all(self):
+        with self._lock:
+            self.sync()
+            return [self._by_id[key[2]] for key in self._timeline]
+
+    def query(self, doctor=None, date_from=None, date_to=None, status=None, cursor=None, limit=100):
+        """Appointments ordered by (date, time), with optional filters.
+
+        Returns (appointments, next_cursor); next_cursor is None on the last page.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        results = []
+
+        with self._lock:
+            self.sync()
+            if doctor is not None and date_from is not None and date_from == date_to:
+                # Doctor's daily view straight from the secondary index
+                day = self._by_doctor_date.get((doctor, date_from), [])
+                start = bisect_right(day, after[1:]) if after and after[0] == date_from else 0
+                keys = ((date_from, time_, appointment_id) for time_, appointment_id in day[start:])
+            else:
+                if after is not None:
+                    start = bisect_right(self._timeline, after)
+                elif date_from:
+                    start = bisect_left(self._timeline, (date_from,))
+                else:
+                    start = 0
+                keys = (self._timeline[i] for i in range(start, len(self._timeline)))
+
+            for key in keys:
+                if date_to and key[0] > date_to:
+                    break
+                appointment = self._by_id[key[2]]
+                if doctor is not None and appointment.get('doctor') != doctor:
+                    continue
+                if status is not None and appointment.get('status') != status:
+                    continue
+                if len(results) == limit:
+                    return results, encode_cursor(_sort_key(results[-1]))
+                results.append(appointment)
+
+        return results, None
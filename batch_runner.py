@@ -0,0 +1,254 @@
+# batch_runner.py
+"""Non-interactive batch analysis for dia.py and hyper.py.
+
+Reads readings from a CSV or JSONL export, validates each row with the same
+reading_schema the app and the interactive questionnaire use, analyzes up to
+`concurrency` rows at a time and appends each result to the records file as
+soon as it is ready.
+
+Columns may be named after the full question text or after its short field
+name (e.g. `sugar_level`); an optional `timestamp` column is kept.
+
+Checkpoint/resume: every `checkpoint_every` results the records file is
+fsynced and `<records>.checkpoint` notes how far the batch got. A re-run with
+the same input skips rows that are already in the records file, so a crashed
+or interrupted backfill picks up where it stopped. Rows that fail validation
+or analysis are listed in `<records>.errors.jsonl`; invalid rows are not
+looked at again, failed analyses are retried on the next run.
+"""
+import csv
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import requests
+
+from resilience import RETRYABLE_STATUS, backoff_delay, retry_after_seconds
+
+
+# ================== Input ==================
+
+def read_rows(path):
+    """Yield (row_number, row dict) from a .csv or .jsonl file, one row at a time"""
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            for number, row in enumerate(csv.DictReader(f), 1):
+                yield number, row
+        return
+
+    with open(path, encoding='utf-8') as f:
+        number = 0
+        for line in f:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = ValueError(f"Invalid JSON: {str(e)}")
+            yield number, row
+
+
+def parse_row(row, schema):
+    """Validate a row with the questionnaire's schema; returns a typed reading.
+
+    Raises ValueError (SchemaError) listing every problem in the row.
+    """
+    if isinstance(row, Exception):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError("Row is not an object")
+    return schema.parse(row)
+
+
+# ================== Analysis ==================
+
+def with_retries(fn, retries=3):
+    """Call fn(), retrying Groq rate limits, server errors and dropped connections"""
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except (requests.HTTPError, requests.ConnectionError) as e:
+            response = getattr(e, 'response', None)
+            status = response.status_code if response is not None else None
+            retryable = status in RETRYABLE_STATUS or isinstance(e, requests.ConnectionError)
+            if not retryable or attempt >= retries:
+                raise
+            time.sleep(backoff_delay(attempt, retry_after=retry_after_seconds(response)))
+            attempt += 1
+
+
+# ================== Checkpoints ==================
+
+class Checkpoint:
+    """Which rows of one input file are already in the records file.
+
+    Rows up to `watermark` are all done; `done` holds finished rows above it
+    (results arrive out of order). `offset` is the records file size when
+    the checkpoint was taken; entries after it are found by scanning.
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = source
+        self.watermark = 0
+        self.done = set()
+        self.offset = 0
+
+    def is_done(self, number):
+        return number <= self.watermark or number in self.done
+
+    def mark(self, number):
+        self.done.add(number)
+        while self.watermark + 1 in self.done:
+            self.watermark += 1
+            self.done.discard(self.watermark)
+
+    def load(self, records_path):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                state = json.load(f)
+            if state.get('source') == self.source:
+                self.watermark = state['watermark']
+                self.done = set(state['done'])
+                self.offset = state['offset']
+
+        # Results written after the last checkpoint
+        if not os.path.exists(records_path):
+            return
+        if os.path.getsize(records_path) < self.offset:
+            self.offset = 0
+        with open(records_path, 'rb') as f:
+            f.seek(self.offset)
+            for line in f:
+                try:
+                    batch = json.loads(line).get('batch') or {}
+                except ValueError:
+                    continue
+                if batch.get('source') == self.source:
+                    self.mark(batch['row'])
+
+    def save(self, offset):
+        self.offset = offset
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'source': self.source,
+                'watermark': self.watermark,
+                'done': sorted(self.done),
+                'offset': offset,
+                'saved_at': datetime.now().isoformat()
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# ================== Runner ==================
+
+def run_batch(source, schema, analyze, records_path, concurrency=8,
+              fresh=False, checkpoint_every=100, retries=3):
+    """Analyze every row of `source` and append the results to `records_path`.
+
+    Returns a dict of counts: analyzed, skipped, invalid, failed.
+    """
+    source = os.path.abspath(source)
+    checkpoint = Checkpoint(records_path + '.checkpoint', source)
+    if fresh:
+        checkpoint.clear()
+    else:
+        checkpoint.load(records_path)
+        if checkpoint.watermark or checkpoint.done:
+            print(f"Resuming: {checkpoint.watermark + len(checkpoint.done)} rows already done")
+
+    counts = {'analyzed': 0, 'skipped': 0, 'invalid': 0, 'failed': 0}
+    started = time.time()
+
+    records = open(records_path, 'a+b')
+    # Don't glue the first new entry onto a line torn by a crash
+    if records.tell() > 0:
+        records.seek(-1, os.SEEK_END)
+        if records.read(1) != b'\n':
+            records.write(b'\n')
+    errors = open(records_path + '.errors.jsonl', 'w' if fresh else 'a')
+
+    def write_error(number, kind, message):
+        errors.write(json.dumps({'row': number, 'error': kind, 'message': message}) + '\n')
+
+    def analyze_row(number, reading, timestamp):
+        analysis = with_retries(lambda: analyze(reading), retries)
+        return {
+            'timestamp': timestamp or datetime.now().isoformat(),
+            'data': reading.to_answers(),
+            'analysis': analysis,
+            'batch': {'source': source, 'row': number}
+        }
+
+    def finish(future):
+        number = in_flight.pop(future)
+        try:
+            entry = future.result()
+        except Exception as e:
+            counts['failed'] += 1
+            write_error(number, 'analysis', str(e))
+            return
+        records.write((json.dumps(entry) + '\n').encode())
+        checkpoint.mark(number)
+        counts['analyzed'] += 1
+        if counts['analyzed'] % checkpoint_every == 0:
+            save_checkpoint()
+
+    def save_checkpoint():
+        records.flush()
+        os.fsync(records.fileno())
+        checkpoint.save(records.tell())
+        elapsed = time.time() - started
+        print(f"{counts['analyzed']} analyzed, {counts['invalid']} invalid, {counts['failed']} failed "
+              f"({counts['analyzed'] / elapsed:.1f} rows/s)")
+
+    in_flight = {}
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for number, row in read_rows(source):
+                if checkpoint.is_done(number):
+                    counts['skipped'] += 1
+                    continue
+                try:
+                    reading = parse_row(row, schema)
+                except ValueError as e:
+                    counts['invalid'] += 1
+                    write_error(number, 'validation', str(e))
+                    checkpoint.mark(number)
+                    continue
+
+                # Keep at most `concurrency` rows in flight; read more as they finish
+                while len(in_flight) >= concurrency:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finish(future)
+                timestamp = row.get('timestamp') if isinstance(row, dict) else None
+                in_flight[pool.submit(analyze_row, number, reading, timestamp)] = number
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(future)
+    finally:
+        save_checkpoint()
+        records.close()
+        errors.close()
+
+    return counts
+
+
+def add_batch_arguments(parser, records_path):
+    parser.add_argument('--batch', metavar='FILE', help="analyze every reading in a .csv or .jsonl file")
+    parser.add_argument('--concurrency', type=int, default=8, help="analyses in flight at once")
+    parser.add_argument('--records', default=records_path, help="file results are appended to")
+    parser.add_argument('--fresh', action='store_true', help="ignore the checkpoint and start over")
+    parser.add_argument('--checkpoint-every', type=int, default=100, help="results between checkpoints")
@@ -0,0 +1,508 @@
+# benchmarks/loadtest.py
+"""End-to-end benchmark: runs app.py against a mock Groq server and loads it.
+
+Scenarios:
+    chat                concurrent Socket.IO clients sending user_message
+    analyze             the diabetes/hypertension question flow ending in analyze_data
+    upload              POST /api/upload
+    files               GET /api/files
+    appointments        POST /api/appointments
+    appointments_list   GET /api/appointments
+
+Each scenario reports requests, errors, throughput and p50/p95/p99 latency;
+the app's resident memory is reported at the start, at the end and at its peak.
+
+    python benchmarks/loadtest.py                          # run everything
+    python benchmarks/loadtest.py --scenarios chat --stream --clients 50
+    python benchmarks/loadtest.py --save-baseline main     # store results
+    python benchmarks/loadtest.py --compare main           # exit 1 on regression
+
+The app runs in a temporary working directory, so its data/ and uploads
+don't touch the checkout.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import queue
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import socketio
+
+from mock_groq import start_mock
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+BASELINE_DIR = os.path.join(BENCH_DIR, 'baselines')
+
+SCENARIOS = ('chat', 'analyze', 'upload', 'files', 'appointments', 'appointments_list')
+SOCKET_SCENARIOS = ('chat', 'analyze')
+
+# Started with `python -c` so the Werkzeug reloader from app.py's __main__ stays off
+BOOT_SCRIPT = """
+import os
+import app
+flask_app = app.create_app()
+app.socketio.run(flask_app, host='127.0.0.1', port=int(os.environ['BENCH_PORT']),
+                 allow_unsafe_werkzeug=True, log_output=False)
+"""
+
+# Every simulated client logs in as the same demo patient/doctor, so the
+# per-user rate limits are lifted by default; pass --env to test them
+DEFAULT_APP_ENV = {
+    'RATE_LIMIT_USER_RPM': '1000000',
+    'RATE_LIMIT_USER_BURST': '1000000',
+    'RATE_LIMIT_USER_TPM': '1000000000'
+}
+
+CREDENTIALS = {
+    'patient': 'patient123',
+    'doctor': 'doctor123'
+}
+
+
+# ================== App process ==================
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def read_memory(pid):
+    """(current RSS, peak RSS) of a process in MiB, or (None, None) off Linux"""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    name, amount = line.split(':')
+                    values[name] = int(amount.split()[0]) / 1024
+    except OSError:
+        return None, None
+    return values.get('VmRSS'), values.get('VmHWM')
+
+
+class AppProcess:
+    def __init__(self, groq_url, env=None):
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.workdir = tempfile.mkdtemp(prefix='healthsync-bench-')
+        self.env = dict(os.environ, **(env or {}))
+        self.env.update({
+            'PYTHONPATH': REPO_DIR + os.pathsep + self.env.get('PYTHONPATH', ''),
+            'GROQ_API_URL': groq_url,
+            'GROQ_API_KEY': 'benchmark',
+            'BENCH_PORT': str(self.port)
+        })
+        self.process = None
+
+    def start(self, timeout=60):
+        # Log to a file: an undrained pipe fills up and blocks the server's logging
+        self.log_path = os.path.join(self.workdir, 'app.log')
+        self.log = open(self.log_path, 'w')
+        self.process = subprocess.Popen(
+            [sys.executable, '-c', BOOT_SCRIPT], cwd=self.workdir, env=self.env,
+            stdout=self.log, stderr=subprocess.STDOUT)
+
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                with open(self.log_path) as f:
+                    raise RuntimeError(f"App exited during startup:\n{f.read()}")
+            try:
+                requests.get(f"{self.base_url}/login", timeout=1)
+                return self
+            except requests.ConnectionError:
+                time.sleep(0.2)
+        raise RuntimeError("App did not start in time")
+
+    def memory(self):
+        return read_memory(self.process.pid)
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.log.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def login(base_url, role):
+    http = requests.Session()
+    response = http.post(f"{base_url}/login", allow_redirects=False, data={
+        'username': role, 'password': CREDENTIALS[role], 'role': role
+    })
+    if response.status_code != 302:
+        raise RuntimeError(f"Login as {role} failed with status {response.status_code}")
+    return http
+
+
+# ================== Results ==================
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class Recorder:
+    """Collects latencies (seconds) and errors for one scenario"""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.errors = {}
+        self._lock = threading.Lock()
+        self.started = None
+        self.finished = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.finished = time.perf_counter()
+        return False
+
+    def ok(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def error(self, kind):
+        with self._lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def summary(self):
+        values = sorted(self.latencies)
+        wall = (self.finished or time.perf_counter()) - self.started
+        ms = lambda value: round(value * 1000, 2) if value is not None else None
+        return {
+            'requests': len(values),
+            'errors': sum(self.errors.values()),
+            'error_kinds': dict(self.errors),
+            'wall_seconds': round(wall, 3),
+            'throughput_rps': round(len(values) / wall, 2) if wall > 0 else None,
+            'p50_ms': ms(percentile(values, 0.50)),
+            'p95_ms': ms(percentile(values, 0.95)),
+            'p99_ms': ms(percentile(values, 0.99)),
+            'max_ms': ms(values[-1] if values else None)
+        }
+
+
+# ================== Socket.IO scenarios ==================
+
+class BotClient:
+    """A logged-in patient with a Socket.IO connection; events land in a queue"""
+
+    REPLY_EVENTS = ('bot_response', 'bot_response_chunk', 'bot_response_end',
+                    'message', 'start_questions')
+
+    def __init__(self, base_url):
+        self.http = login(base_url, 'patient')
+        self.events = queue.Queue()
+        self.sio = socketio.Client(reconnection=False, http_session=self.http)
+        for event in self.REPLY_EVENTS:
+            self.sio.on(event, self._handler(event))
+        self.sio.connect(base_url, wait_timeout=10)
+        # Swallow the greeting sent on connect
+        self.wait_for(('bot_response',), timeout=10)
+
+    def _handler(self, event):
+        def handle(data=None):
+            self.events.put((event, data, time.perf_counter()))
+        return handle
+
+    def wait_for(self, names, timeout, on_event=None):
+        deadline = time.perf_counter() + timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise TimeoutError(f"No {names} within {timeout}s")
+            event, data, received = self.events.get(timeout=remaining)
+            if on_event is not None:
+                on_event(event, data, received)
+            if event in names:
+                return event, data, received
+
+    def close(self):
+        self.sio.disconnect()
+
+
+def fill_answers(questions, condition):
+    """Plausible, varied answers so each analysis is a distinct prompt"""
+    answers = {}
+    numbers = iter([random.randint(110, 170), random.randint(70, 100)] if condition == 'hypertension'
+                   else [random.randint(70, 260)])
+    for question in questions:
+        text = question.lower()
+        if 'fasting' in text:
+            answers[question] = random.choice(['fasting', 'post'])
+        elif 'hours' in text:
+            answers[question] = str(random.randint(4, 9))
+        elif 'liters' in text:
+            answers[question] = str(round(random.uniform(0.5, 3), 1))
+        elif 'yes/no' in text or text.startswith(('have', 'did', 'do ')):
+            answers[question] = random.choice(['yes', 'no'])
+        else:
+            answers[question] = str(next(numbers, random.randint(1, 10)))
+    return answers
+
+
+def run_socket_client(base_url, scenario, index, settings, recorder, first_chunk):
+    try:
+        client = BotClient(base_url)
+    except Exception as e:
+        recorder.error(f"connect: {type(e).__name__}")
+        return
+
+    final_events = ('bot_response', 'bot_response_end') if scenario == 'chat' else ('message', 'bot_response_end')
+    try:
+        for i in range(settings.messages):
+            got_chunk = []
+
+            def on_event(event, data, received):
+                if event == 'bot_response_chunk' and not got_chunk:
+                    got_chunk.append(received)
+
+            try:
+                if scenario == 'analyze':
+                    condition = random.choice(['diabetes', 'hypertension'])
+                    client.sio.emit('user_message', {'message': condition})
+                    _, data, _ = client.wait_for(('start_questions',), settings.timeout)
+                    started = time.perf_counter()
+                    client.sio.emit('analyze_data', {
+                        'type': condition,
+                        'answers': fill_answers(data['questions'], condition),
+                        'stream': settings.stream
+                    })
+                else:
+                    started = time.perf_counter()
+                    client.sio.emit('user_message', {
+                        'message': f"Question {index}-{i}: how can I keep my blood sugar stable?",
+                        'stream': settings.stream
+                    })
+                _, data, received = client.wait_for(final_events, settings.timeout, on_event)
+            except (TimeoutError, queue.Empty):
+                recorder.error('timeout')
+                continue
+
+            if (data or {}).get('busy'):
+                recorder.error('busy')
+                continue
+            recorder.ok(received - started)
+            if got_chunk:
+                first_chunk.ok(got_chunk[0] - started)
+    finally:
+        client.close()
+
+
+def run_socket_scenario(base_url, scenario, settings):
+    recorder = Recorder(scenario)
+    first_chunk = Recorder(f"{scenario}_first_chunk")
+    threads = [threading.Thread(target=run_socket_client,
+                                args=(base_url, scenario, index, settings, recorder, first_chunk))
+               for index in range(settings.clients)]
+    with recorder, first_chunk:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    results = {scenario: recorder.summary()}
+    if first_chunk.latencies:
+        results[first_chunk.name] = first_chunk.summary()
+    return results
+
+
+# ================== HTTP scenarios ==================
+
+def http_request(scenario, http, base_url, index, settings):
+    if scenario == 'upload':
+        payload = os.urandom(settings.upload_kb * 1024)
+        return http.post(f"{base_url}/api/upload", timeout=settings.timeout,
+                         files={'file': (f"bench-{index}.pdf", payload, 'application/pdf')},
+                         data={'category': 'Lab Report', 'description': 'benchmark'})
+    if scenario == 'files':
+        return http.get(f"{base_url}/api/files", timeout=settings.timeout)
+    if scenario == 'appointments':
+        day = 1 + index % 28
+        return http.post(f"{base_url}/api/appointments", timeout=settings.timeout, json={
+            'doctor': random.choice(['Dr. Smith', 'Dr. Jones']),
+            'date': f"2025-01-{day:02d}",
+            'time': f"{9 + index % 8:02d}:00",
+            'reason': 'benchmark'
+        })
+    return http.get(f"{base_url}/api/appointments", params={'limit': 100}, timeout=settings.timeout)
+
+
+def run_http_scenario(base_url, scenario, settings):
+    recorder = Recorder(scenario)
+    local = threading.local()
+
+    def one(index):
+        http = getattr(local, 'http', None)
+        if http is None:
+            http = local.http = login(base_url, 'doctor')
+        started = time.perf_counter()
+        try:
+            response = http_request(scenario, http, base_url, index, settings)
+        except requests.RequestException as e:
+            recorder.error(type(e).__name__)
+            return
+        if response.status_code >= 400:
+            recorder.error(f"status {response.status_code}")
+            return
+        recorder.ok(time.perf_counter() - started)
+
+    with recorder, ThreadPoolExecutor(settings.concurrency) as pool:
+        list(pool.map(one, range(settings.http_requests)))
+    return {scenario: recorder.summary()}
+
+
+# ================== Baselines ==================
+
+def baseline_path(name):
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def save_baseline(name, report):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    with open(baseline_path(name), 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Baseline saved to {baseline_path(name)}")
+
+
+def compare(report, baseline, threshold):
+    """Print the change per scenario; return the list of regressions"""
+    regressions = []
+    print(f"\nCompared with baseline from {baseline.get('created_at')}:")
+    for scenario, current in report['scenarios'].items():
+        previous = baseline['scenarios'].get(scenario)
+        if not previous:
+            continue
+        for metric, worse_when in (('p95_ms', 'higher'), ('p99_ms', 'higher'), ('throughput_rps', 'lower')):
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            regressed = change > threshold if worse_when == 'higher' else change < -threshold
+            marker = '  REGRESSION' if regressed else ''
+            print(f"  {scenario:<24} {metric:<15} {old:>10} -> {new:>10} ({change:+.0%}){marker}")
+            if regressed:
+                regressions.append((scenario, metric, old, new))
+    return regressions
+
+
+def print_report(report):
+    header = f"{'scenario':<24} {'reqs':>6} {'errs':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print('\n' + header)
+    print('-' * len(header))
+    for scenario, result in report['scenarios'].items():
+        print(f"{scenario:<24} {result['requests']:>6} {result['errors']:>5} "
+              f"{result['throughput_rps'] or 0:>8} {result['p50_ms'] or '-':>9} "
+              f"{result['p95_ms'] or '-':>9} {result['p99_ms'] or '-':>9}")
+    memory = report['memory_mb']
+    print(f"\nApp memory (MiB): start {memory['start']}, end {memory['end']}, peak {memory['peak']}")
+
+
+# ================== Main ==================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="HealthSync load test against a mock Groq server")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument('--clients', type=int, default=20, help="concurrent Socket.IO clients")
+    parser.add_argument('--messages', type=int, default=5, help="messages per Socket.IO client")
+    parser.add_argument('--stream', action='store_true', help="ask for streamed completions")
+    parser.add_argument('--http-requests', type=int, default=200, help="requests per HTTP scenario")
+    parser.add_argument('--concurrency', type=int, default=16, help="concurrent HTTP requests")
+    parser.add_argument('--upload-kb', type=int, default=64, help="size of each uploaded file")
+    parser.add_argument('--timeout', type=float, default=60, help="seconds to wait for any reply")
+    parser.add_argument('--latency', type=float, default=0.2, help="mock Groq latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.05, help="mock Groq latency jitter in seconds")
+    parser.add_argument('--chunk-delay', type=float, default=0.01, help="seconds between streamed chunks")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of mock Groq calls failing")
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help="extra environment for the app (repeatable), e.g. LLM_WORKERS=8")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="also write the JSON report to this file")
+    parser.add_argument('--save-baseline', metavar='NAME', help="store results as a named baseline")
+    parser.add_argument('--compare', metavar='NAME', help="compare with a named baseline")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="relative change in p95/p99/throughput counted as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    settings = parse_args(argv)
+    random.seed(settings.seed)
+    scenarios = [name.strip() for name in settings.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    mock = start_mock(latency=settings.latency, jitter=settings.jitter,
+                      chunk_delay=settings.chunk_delay, error_rate=settings.error_rate)
+    env = dict(DEFAULT_APP_ENV, **dict(item.split('=', 1) for item in settings.env))
+    app_process = AppProcess(mock.url, env).start()
+
+    peak = 0
+    try:
+        start_memory, _ = app_process.memory()
+        results = {}
+        for scenario in scenarios:
+            print(f"Running {scenario}...")
+            if scenario in SOCKET_SCENARIOS:
+                results.update(run_socket_scenario(app_process.base_url, scenario, settings))
+            else:
+                results.update(run_http_scenario(app_process.base_url, scenario, settings))
+        end_memory, peak = app_process.memory()
+    finally:
+        app_process.stop()
+        mock.shutdown()
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'settings': {key: value for key, value in vars(settings).items()
+                     if key not in ('output', 'save_baseline', 'compare')},
+        'groq_calls': mock.calls,
+        'memory_mb': {
+            'start': round(start_memory, 1) if start_memory else None,
+            'end': round(end_memory, 1) if end_memory else None,
+            'peak': round(peak, 1) if peak else None
+        },
+        'scenarios': results
+    }
+    print_report(report)
+
+    if settings.output:
+        with open(settings.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if settings.save_baseline:
+        save_baseline(settings.save_baseline, report)
+    if settings.compare:
+        with open(baseline_path(settings.compare)) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, settings.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
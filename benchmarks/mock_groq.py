@@ -0,0 +1,129 @@
+# benchmarks/mock_groq.py
+"""Local stand-in for Groq's /openai/v1/chat/completions endpoint.
+
+Answers every completion after a configurable delay, either as one JSON body
+or as a server-sent event stream (when the request has "stream": true), so
+benchmarks measure our code instead of the real API.
+
+Run it on its own:
+
+    python benchmarks/mock_groq.py --port 8099 --latency 0.3 --chunk-delay 0.02
+
+then point the app at it with GROQ_API_URL=http://127.0.0.1:8099/openai/v1/chat/completions
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETIONS_PATH = '/openai/v1/chat/completions'
+DEFAULT_TEXT = ("Keep tracking your readings at the same time each day, stay hydrated, "
+                "take your medication as prescribed and talk to your doctor if symptoms continue.")
+
+
+class MockGroqServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.2, jitter=0.0, chunk_delay=0.01, error_rate=0.0, text=DEFAULT_TEXT):
+        super().__init__(address, MockGroqHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_delay = chunk_delay
+        self.error_rate = error_rate
+        self.text = text
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{COMPLETIONS_PATH}"
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections is normal; don't print tracebacks for it
+        pass
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.path != COMPLETIONS_PATH:
+            self._send_json(404, {'error': {'message': 'Not found'}})
+            return
+
+        with server._lock:
+            server.calls += 1
+
+        time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+        if server.error_rate and random.random() < server.error_rate:
+            self._send_json(503, {'error': {'message': 'Service unavailable'}})
+            return
+
+        if body.get('stream'):
+            self._send_stream(server.text.split(' '), server.chunk_delay)
+        else:
+            self._send_json(200, {
+                'model': body.get('model'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': server.text}}]
+            })
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, words, chunk_delay):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def write_chunk(data):
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            self.wfile.flush()
+
+        for i, word in enumerate(words):
+            delta = {'choices': [{'index': 0, 'delta': {'content': word if i == 0 else ' ' + word}}]}
+            write_chunk(f"data: {json.dumps(delta)}\n\n".encode())
+            time.sleep(chunk_delay)
+        write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b'0\r\n\r\n')
+
+
+def start_mock(port=0, **settings):
+    """Start a mock server in a background thread and return it"""
+    return MockGroqServer(('127.0.0.1', port), **settings).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Groq chat completions server")
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.2, help="seconds before the first byte")
+    parser.add_argument('--jitter', type=float, default=0.0, help="+/- seconds added to latency")
+    parser.add_argument('--chunk-delay', type=float, default=0.01, help="seconds between streamed chunks")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    server = MockGroqServer(('127.0.0.1', args.port), latency=args.latency, jitter=args.jitter,
+                            chunk_delay=args.chunk_delay, error_rate=args.error_rate)
+    print(f"Mock Groq listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+# benchmarks/startup.py
+"""Cold-start benchmark: how long a fresh worker takes to serve its first request.
+
+Each run starts a new interpreter in a temporary working directory and
+times three phases:
+
+    import      `import app`
+    create      create_app()
+    first       the first request (GET --path) through the test client
+
+plus the whole thing from process spawn, and which lazy services the first
+request had to build (and how long each took). --readings seeds the data
+directory with that much reading history, so backfills show up the way they
+do on a real deployment; --eager builds every service before the first
+request, which is how the app started before create_app().
+
+    python benchmarks/startup.py                              # 10 runs
+    python benchmarks/startup.py --readings 200000 --eager    # compare with eager startup
+    python benchmarks/startup.py --subsystems uploads --path /api/files
+    python benchmarks/startup.py --importtime                 # slowest imports
+    python benchmarks/startup.py --save-baseline main         # store results
+    python benchmarks/startup.py --compare main               # exit 1 on regression
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+BASELINE_DIR = os.path.join(BENCH_DIR, 'baselines')
+
+sys.path.insert(0, REPO_DIR)
+
+PHASES = ('import_ms', 'create_ms', 'first_request_ms', 'total_ms')
+
+# Runs in the fresh interpreter; the report is the line starting with RESULT_PREFIX
+RESULT_PREFIX = 'STARTUP '
+PROBE_SCRIPT = """
+import json, os, sys, time
+started = time.perf_counter()
+import app as healthsync
+imported = time.perf_counter()
+flask_app = healthsync.create_app()
+flask_app.config['TESTING'] = True
+if os.environ.get('BENCH_EAGER') == '1':
+    for service in healthsync.services.values():
+        service.resolve()
+created = time.perf_counter()
+
+client = flask_app.test_client()
+with client.session_transaction() as session:
+    session['user'] = {'username': os.environ['BENCH_ROLE'], 'role': os.environ['BENCH_ROLE']}
+status = client.get(os.environ['BENCH_PATH']).status_code
+finished = time.perf_counter()
+
+print(%r + json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_ms': (created - imported) * 1000,
+    'first_request_ms': (finished - created) * 1000,
+    'status': status,
+    'modules': len(sys.modules),
+    'services': {name: round(service.seconds * 1000, 2)
+                 for name, service in healthsync.services.items() if service.built}
+}))
+sys.stdout.flush()
+os._exit(0)  # don't wait for pools a service may have started
+""" % RESULT_PREFIX
+
+
+# ================== Data ==================
+
+def seed_data(data_dir, readings, patients=200, days=30):
+    """A readings database with `readings` rows spread over `days` days"""
+    from reading_store import ReadingStore
+    from risk_engine import classify_bp, classify_glucose
+
+    os.makedirs(data_dir, exist_ok=True)
+    store = ReadingStore(os.path.join(data_dir, 'readings.db'))
+    now = time.time()
+    rng = random.Random(1)
+
+    def rows():
+        for _ in range(readings):
+            patient = f"patient{rng.randrange(patients)}"
+            timestamp = now - rng.random() * days * 86400
+            if rng.random() < 0.5:
+                value = rng.uniform(70, 250)
+                category, risk_level = classify_glucose(value, False)
+                yield {'patient': patient, 'condition': 'diabetes', 'value': value, 'timestamp': timestamp,
+                       'category': category, 'risk_level': risk_level, 'data': {'reading_type': 'post'}}
+            else:
+                systolic, diastolic = rng.uniform(100, 190), rng.uniform(60, 120)
+                category, risk_level = classify_bp(systolic, diastolic)
+                yield {'patient': patient, 'condition': 'hypertension', 'value': systolic,
+                       'value2': diastolic, 'timestamp': timestamp,
+                       'category': category, 'risk_level': risk_level}
+
+    count = store.add_many(rows())
+    print(f"Seeded {count} readings")
+
+
+# ================== Runs ==================
+
+def run_once(settings, template_dir):
+    workdir = tempfile.mkdtemp(prefix='healthsync-startup-')
+    try:
+        if template_dir:
+            shutil.copytree(template_dir, os.path.join(workdir, 'data'))
+        env = dict(os.environ, **dict(item.split('=', 1) for item in settings.env))
+        env.update({
+            'PYTHONPATH': REPO_DIR + os.pathsep + env.get('PYTHONPATH', ''),
+            'GROQ_API_KEY': env.get('GROQ_API_KEY', 'benchmark'),
+            'BENCH_PATH': settings.path,
+            'BENCH_ROLE': settings.role,
+            'BENCH_EAGER': '1' if settings.eager else '0'
+        })
+        if settings.subsystems:
+            env['SUBSYSTEMS'] = settings.subsystems
+
+        started = time.perf_counter()
+        completed = subprocess.run([sys.executable, '-c', PROBE_SCRIPT], cwd=workdir, env=env,
+                                   capture_output=True, text=True, timeout=settings.timeout)
+        total = (time.perf_counter() - started) * 1000
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            result = json.loads(line[len(RESULT_PREFIX):])
+            result['total_ms'] = total
+            return result
+    raise RuntimeError(f"Startup probe failed:\n{completed.stdout}\n{completed.stderr}")
+
+
+def import_profile(top):
+    """The slowest top-level imports of `import app` (python -X importtime), cumulative ms"""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                               cwd=tempfile.gettempdir(), capture_output=True, text=True,
+                               env=dict(os.environ, PYTHONPATH=REPO_DIR))
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # One space after the separator, then two of nesting: imported by app.py itself
+        if name.startswith('   ') and not name.startswith('    '):
+            modules.append((int(cumulative) / 1000, name.strip()))
+    return sorted(modules, reverse=True)[:top]
+
+
+def summarize(results):
+    summary = {}
+    for phase in PHASES:
+        values = sorted(result[phase] for result in results)
+        summary[phase] = {
+            'median': round(statistics.median(values), 2),
+            'min': round(values[0], 2),
+            'max': round(values[-1], 2)
+        }
+    return summary
+
+
+# ================== Baselines ==================
+
+def baseline_path(name):
+    return os.path.join(BASELINE_DIR, f"startup-{name}.json")
+
+
+def save_baseline(name, report):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    with open(baseline_path(name), 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Baseline saved to {baseline_path(name)}")
+
+
+def compare(report, baseline, threshold):
+    """Print the change in median per phase; return the list of regressions"""
+    regressions = []
+    print(f"\nCompared with baseline from {baseline.get('created_at')}:")
+    for phase in PHASES:
+        old = baseline['phases'].get(phase, {}).get('median')
+        new = report['phases'][phase]['median']
+        if not old:
+            continue
+        change = (new - old) / old
+        regressed = change > threshold
+        marker = '  REGRESSION' if regressed else ''
+        print(f"  {phase:<18} {old:>10} -> {new:>10} ({change:+.0%}){marker}")
+        if regressed:
+            regressions.append((phase, old, new))
+    return regressions
+
+
+def print_report(report):
+    header = f"{'phase':<18} {'median ms':>10} {'min ms':>10} {'max ms':>10}"
+    print('\n' + header)
+    print('-' * len(header))
+    for phase, values in report['phases'].items():
+        print(f"{phase:<18} {values['median']:>10} {values['min']:>10} {values['max']:>10}")
+    print(f"\nFirst request: GET {report['settings']['path']} -> {report['status']}, "
+          f"{report['modules']} modules loaded")
+    if report['services']:
+        built = ', '.join(f"{name} {ms} ms" for name, ms in report['services'].items())
+        print(f"Services built (median): {built}")
+    else:
+        print("Services built: none")
+
+
+# ================== Main ==================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="HealthSync cold-start benchmark")
+    parser.add_argument('--runs', type=int, default=10, help="fresh processes to start")
+    parser.add_argument('--path', default='/api/latest_readings', help="first request to time")
+    parser.add_argument('--role', default='doctor', choices=('patient', 'doctor'),
+                        help="user logged in for the first request")
+    parser.add_argument('--subsystems', help="comma-separated SUBSYSTEMS for create_app()")
+    parser.add_argument('--readings', type=int, default=0, help="reading history to seed the data directory with")
+    parser.add_argument('--eager', action='store_true', help="build every service before the first request")
+    parser.add_argument('--importtime', action='store_true', help="also list the slowest imports")
+    parser.add_argument('--top', type=int, default=15, help="imports to list with --importtime")
+    parser.add_argument('--timeout', type=float, default=120, help="seconds to wait for one run")
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help="extra environment for the app (repeatable), e.g. STATE_BACKEND=sqlite")
+    parser.add_argument('--output', help="also write the JSON report to this file")
+    parser.add_argument('--save-baseline', metavar='NAME', help="store results as a named baseline")
+    parser.add_argument('--compare', metavar='NAME', help="compare with a named baseline")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="relative increase in a median counted as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    settings = parse_args(argv)
+
+    template_dir = None
+    if settings.readings:
+        template_dir = tempfile.mkdtemp(prefix='healthsync-startup-data-')
+        seed_data(template_dir, settings.readings)
+
+    results = []
+    try:
+        for index in range(settings.runs):
+            result = run_once(settings, template_dir)
+            print(f"Run {index + 1}: import {result['import_ms']:.0f} ms, create {result['create_ms']:.0f} ms, "
+                  f"first request {result['first_request_ms']:.0f} ms, total {result['total_ms']:.0f} ms")
+            results.append(result)
+    finally:
+        if template_dir:
+            shutil.rmtree(template_dir, ignore_errors=True)
+
+    services = {}
+    for name in results[0]['services']:
+        times = [result['services'][name] for result in results if name in result['services']]
+        services[name] = round(statistics.median(times), 2)
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'settings': {key: value for key, value in vars(settings).items()
+                     if key not in ('output', 'save_baseline', 'compare')},
+        'phases': summarize(results),
+        'status': results[0]['status'],
+        'modules': results[0]['modules'],
+        'services': services
+    }
+    print_report(report)
+
+    if settings.importtime:
+        print("\nSlowest imports of app.py (cumulative ms):")
+        for ms, name in import_profile(settings.top):
+            print(f"  {name:<28} {ms:>8.1f}")
+
+    if settings.output:
+        with open(settings.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if settings.save_baseline:
+        save_baseline(settings.save_baseline, report)
+    if settings.compare:
+        with open(baseline_path(settings.compare)) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, settings.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
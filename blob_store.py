@@ -0,0 +1,147 @@
+# blob_store.py
+"""Content-addressed storage for uploaded files.
+
+Uploads are written to a temp file while their SHA-256 is computed, then
+renamed to `<sha256>.<ext>`. Identical bytes therefore land on the same blob,
+and any number of file records can point at it. gc() removes blobs that no
+record references any more.
+
+writer() gives a BlobWriter that the multipart parser writes the upload into
+as it arrives, so the body hits the disk once and the size cap applies
+while it is still coming in; save() copies from any readable stream.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+CHUNK_SIZE = 1024 * 1024
+
+BLOB_NAME = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]+$')
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the configured size cap"""
+
+
+class BlobWriter:
+    """A writable temp file in the store that hashes and counts bytes as they are written.
+
+    Reads and seeks go to the underlying file, so it can stand in for the
+    upload's stream. Closed without BlobStore.commit(), it deletes itself.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        fd, self.tmp_path = tempfile.mkstemp(dir=store.tmp_dir)
+        self._file = os.fdopen(fd, 'w+b')
+        self._digest = hashlib.sha256()
+        self.size = 0
+        self.committed = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.store.max_bytes is not None and self.size > self.store.max_bytes:
+            self.close()
+            raise UploadTooLarge(f"File exceeds the {self.store.max_bytes} byte limit")
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def close(self):
+        self._file.close()
+        if not self.committed and os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class BlobStore:
+    def __init__(self, root, max_bytes=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.tmp_dir = os.path.join(root, '.tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path(self, filename):
+        return os.path.join(self.root, filename)
+
+    def writer(self):
+        return BlobWriter(self)
+
+    def commit(self, writer, ext):
+        """Move a fully written BlobWriter to its content address.
+
+        Returns a dict with sha256, size, filename and whether the blob was new.
+        """
+        writer._file.close()  # flush; the temp file itself is moved below
+        sha256 = writer.hexdigest()
+        filename = f"{sha256}.{ext}"
+        final_path = self.path(filename)
+        created = True
+        if os.path.exists(final_path):
+            try:
+                # A fresh mtime keeps gc() from collecting a so far unreferenced
+                # blob before the record pointing at it has been added
+                os.utime(final_path)
+                created = False
+            except FileNotFoundError:
+                pass  # collected just now; store it again
+        if created:
+            os.replace(writer.tmp_path, final_path)
+        else:
+            os.remove(writer.tmp_path)
+        writer.committed = True
+        return {'sha256': sha256, 'size': writer.size, 'filename': filename, 'created': created}
+
+    def save(self, stream, ext):
+        """Store the contents of a file-like object.
+
+        Returns what commit() does. Raises UploadTooLarge (and keeps nothing)
+        if max_bytes is exceeded.
+        """
+        writer = self.writer()
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+            return self.commit(writer, ext)
+        finally:
+            writer.close()
+
+    def gc(self, referenced, grace_seconds=3600):
+        """Delete blobs not in `referenced` (a set of filenames) and stale temp files.
+
+        Anything modified within grace_seconds is kept so uploads still in
+        flight are never collected. Returns (removed_count, freed_bytes).
+        """
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        freed = 0
+
+        candidates = [(self.root, name) for name in os.listdir(self.root)
+                      if BLOB_NAME.match(name) and name not in referenced]
+        candidates += [(self.tmp_dir, name) for name in os.listdir(self.tmp_dir)]
+
+        for directory, name in candidates:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime > cutoff:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+            freed += stat.st_size
+
+        return removed, freed
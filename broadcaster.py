@@ -0,0 +1,77 @@
+# broadcaster.py
+"""Room-targeted, coalesced Socket.IO broadcasts.
+
+Updates published within one coalescing window are flushed together:
+
+- "merge" events (e.g. readings_update) carry dict deltas; all deltas for the
+  same set of rooms are merged and sent as a single emit.
+- Other events are de-duplicated by key, so an item changed several times in
+  the window goes out once, with its latest state.
+
+Each emit targets a list of rooms, so a client in several of them still gets
+the event only once.
+"""
+import threading
+from collections import OrderedDict
+
+# Rooms every authenticated socket joins (see handle_connect)
+DOCTORS_ROOM = 'role:doctor'
+PATIENTS_ROOM = 'role:patient'
+
+
+def patient_room(username):
+    return f"patient:{username}"
+
+
+class Broadcaster:
+    def __init__(self, socketio, window=0.05, merge_events=()):
+        self.socketio = socketio
+        self.window = window
+        self.merge_events = set(merge_events)
+        self._pending = OrderedDict()  # event -> OrderedDict(key -> (payload, rooms))
+        self._lock = threading.Lock()
+        self._scheduled = False
+        self._counter = 0
+
+    def publish(self, event, payload, rooms, key=None):
+        rooms = frozenset(rooms)
+        if self.window <= 0:
+            self._emit(event, payload, rooms)
+            return
+
+        with self._lock:
+            items = self._pending.setdefault(event, OrderedDict())
+            if event in self.merge_events:
+                # Keep one running delta per set of rooms
+                merged = items.get(rooms)
+                if merged is None:
+                    items[rooms] = (dict(payload), rooms)
+                else:
+                    merged[0].update(payload)
+            else:
+                if key is None:
+                    self._counter += 1
+                    key = ('_', self._counter)
+                items.pop(key, None)
+                items[key] = (payload, rooms)
+
+            if not self._scheduled:
+                self._scheduled = True
+                self.socketio.start_background_task(self._flush_later)
+
+    def _flush_later(self):
+        self.socketio.sleep(self.window)
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+            self._scheduled = False
+
+        for event, items in pending.items():
+            for payload, rooms in items.values():
+                self._emit(event, payload, rooms)
+
+    def _emit(self, event, payload, rooms):
+        if rooms:
+            self.socketio.emit(event, payload, to=sorted(rooms))
@@ -0,0 +1,214 @@
+# conversation.py
+"""Bounded per-session chat history for follow-up questions.
+
+Each session keeps its recent turns plus a rolling summary of older ones.
+When the turns would go over `budget_tokens`, add() says so and compact()
+folds the oldest into the summary (with the `summarize` callback, e.g. an
+LLM call, or a short local digest). One compaction per session runs at a
+time; the folded turns stay stored until their summary replaces them.
+
+Compaction may run late or not at all (it is a background job), so the
+budget is enforced where it matters: context() sends the summary plus only
+the newest turns that fit in `budget_tokens` and `max_turns`, and add()
+drops the oldest turns unsummarized once a session holds BACKLOG_FACTOR
+times that. The summary itself is capped at `summary_tokens` and every
+stored message at `max_turn_chars`.
+
+Sessions are kept in LRU order: ones idle for `idle_seconds` are dropped,
+and the least recently used goes when there are more than `max_sessions`.
+"""
+import threading
+import time
+from itertools import islice
+from collections import OrderedDict, deque
+
+from rate_limiter import CHARS_PER_TOKEN, estimate_tokens
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+# How far past the budget a session may grow while waiting for compaction
+BACKLOG_FACTOR = 2
+
+
+def local_summary(previous, turns):
+    """A short digest of folded turns: what was asked and the start of each answer"""
+    lines = [previous] if previous else []
+    for user, assistant, _ in turns:
+        answer = assistant.split('\n', 1)[0]
+        lines.append(f"User asked: {_clip(user, 160)} Assistant: {_clip(answer, 160)}")
+    return '\n'.join(lines)
+
+
+def _clip(text, limit):
+    text = ' '.join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+
+class Conversation:
+    __slots__ = ('summary', 'summary_tokens', 'turns', 'tokens', 'last_used', 'compacting', 'folding')
+
+    def __init__(self, now):
+        self.summary = ''
+        self.summary_tokens = 0
+        self.turns = deque()  # (user, assistant, tokens)
+        self.tokens = 0       # tokens in turns
+        self.last_used = now
+        self.compacting = False
+        self.folding = 0      # oldest turns the running compaction will replace
+
+
+class ConversationStore:
+    def __init__(self, budget_tokens=1500, summary_tokens=300, max_turns=20, max_turn_chars=2000,
+                 max_sessions=1000, idle_seconds=1800, summarize=None, clock=time.monotonic):
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self.max_turns = max_turns
+        self.max_turn_chars = max_turn_chars
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.summarize = summarize or local_summary
+        self._clock = clock
+        self._sessions = OrderedDict()  # key -> Conversation, least recently used first
+        self._lock = threading.Lock()
+        self.compactions = 0
+        self.evictions = 0
+        self.dropped_turns = 0
+
+    def _get(self, key, create):
+        """The session's conversation, marked as just used; evicts idle and excess sessions"""
+        now = self._clock()
+        while self._sessions:
+            oldest_key, oldest = next(iter(self._sessions.items()))
+            if now - oldest.last_used < self.idle_seconds:
+                break
+            del self._sessions[oldest_key]
+            self.evictions += 1
+
+        conversation = self._sessions.get(key)
+        if conversation is None:
+            if not create:
+                return None
+            conversation = self._sessions[key] = Conversation(now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._sessions.move_to_end(key)
+        conversation.last_used = now
+        return conversation
+
+    def context(self, key):
+        """Messages to send before the new question: the summary, then recent turns"""
+        with self._lock:
+            conversation = self._get(key, create=False)
+            if conversation is None:
+                return []
+            messages = []
+            if conversation.summary:
+                messages.append({'role': 'system', 'content': SUMMARY_PREFIX + conversation.summary})
+            for user, assistant, _ in self._recent(conversation):
+                messages.append({'role': 'user', 'content': user})
+                messages.append({'role': 'assistant', 'content': assistant})
+            return messages
+
+    def context_tokens(self, key):
+        with self._lock:
+            conversation = self._sessions.get(key)
+            if conversation is None:
+                return 0
+            return conversation.summary_tokens + sum(turn[2] for turn in self._recent(conversation))
+
+    def _recent(self, conversation):
+        """The newest turns that fit in the budget next to the summary, oldest first"""
+        budget = self.budget_tokens - conversation.summary_tokens
+        recent = []
+        for turn in reversed(conversation.turns):
+            if len(recent) >= self.max_turns or turn[2] > budget:
+                break
+            budget -= turn[2]
+            recent.append(turn)
+        recent.reverse()
+        return recent
+
+    def _over_budget(self, conversation):
+        return (conversation.summary_tokens + conversation.tokens > self.budget_tokens
+                or len(conversation.turns) > self.max_turns)
+
+    def add(self, key, user, assistant):
+        """Remember one exchange; True if the session should now be compacted"""
+        user = user[:self.max_turn_chars]
+        assistant = assistant[:self.max_turn_chars]
+        tokens = estimate_tokens(user) + estimate_tokens(assistant)
+
+        with self._lock:
+            conversation = self._get(key, create=True)
+            conversation.turns.append((user, assistant, tokens))
+            conversation.tokens += tokens
+            # Hard cap for when compaction falls behind or can't be scheduled
+            while len(conversation.turns) > 1 and (
+                    conversation.tokens > BACKLOG_FACTOR * self.budget_tokens
+                    or len(conversation.turns) > BACKLOG_FACTOR * self.max_turns):
+                conversation.tokens -= conversation.turns.popleft()[2]
+                conversation.folding = max(conversation.folding - 1, 0)
+                self.dropped_turns += 1
+            return self._over_budget(conversation) and not conversation.compacting
+
+    def compact(self, key):
+        """Fold the session's oldest turns into its summary if it is over budget"""
+        with self._lock:
+            conversation = self._sessions.get(key)
+            if conversation is None or conversation.compacting or not self._over_budget(conversation):
+                return False
+
+            # Fold the oldest turns until the rest fit in half the budget, so
+            # compaction runs once every few turns rather than on every one
+            target = (self.budget_tokens - self.summary_tokens) // 2
+            count, remaining = 0, conversation.tokens
+            while len(conversation.turns) - count > 1 and (remaining > target
+                                                           or len(conversation.turns) - count > self.max_turns // 2):
+                remaining -= conversation.turns[count][2]
+                count += 1
+            folded = list(islice(conversation.turns, count))
+            previous = conversation.summary
+            conversation.compacting = True
+            conversation.folding = count
+            self.compactions += 1
+
+        # Summarizing may call the LLM, so don't hold the lock for it
+        try:
+            summary = self.summarize(previous, folded)
+        except Exception as e:
+            print(f"Conversation summary failed, using local digest: {str(e)}")
+            summary = local_summary(previous, folded)
+        # Keep the most recent part if it's still too long, from a line start
+        limit = self.summary_tokens * CHARS_PER_TOKEN
+        if len(summary) > limit:
+            summary = summary[-limit:].split('\n', 1)[-1]
+
+        with self._lock:
+            conversation.compacting = False
+            # Cleared or evicted meanwhile: the summary belongs to nobody
+            if self._sessions.get(key) is not conversation:
+                return False
+            # Only new turns were appended since, so the folded ones still
+            # stored (add() may have dropped some) are the oldest
+            for _ in range(conversation.folding):
+                conversation.tokens -= conversation.turns.popleft()[2]
+            conversation.folding = 0
+            conversation.summary = summary
+            conversation.summary_tokens = estimate_tokens(summary)
+        return True
+
+    def clear(self, key):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'turns': sum(len(c.turns) for c in self._sessions.values()),
+                'compactions': self.compactions,
+                'evictions': self.evictions,
+                'dropped_turns': self.dropped_turns
+            }
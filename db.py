@@ -0,0 +1,29 @@
+# db.py
+"""Per-thread SQLite connections for the stores kept in SQLite files.
+
+    connections = ThreadConnections('data/readings.db')
+    connections.get().execute(...)   # this thread's connection
+
+SQLite connections must not be shared between threads, so each thread opens
+its own on first use. All of them run in WAL mode, so readers don't block
+the writer and several worker processes can share one database file.
+"""
+import sqlite3
+import threading
+
+
+class ThreadConnections:
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self):
+        """This thread's connection, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
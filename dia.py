@@ -1,67 +1,70 @@
 # diabetes_monitor.py
-from groq import Groq
+import argparse
 import json
 from datetime import datetime
+from groq_client import get_client, GROQ_MODEL
+from batch_runner import add_batch_arguments, run_batch
+from reading_schema import DIABETES  # Questions and answer types, shared with app.py
 
-api_key = os.getenv("GROQ_API_KEY")
-
-DIABETES_MODEL = "llama3-8b-8192"  # Updated to Groq-supported faster model
+DIABETES_MODEL = GROQ_MODEL  # Shared with app.py via groq_client
+DIABETES_RECORDS = "diabetes_records.json"
 
 def ask_diabetes_questions():
-    questions = [
-        ("What is your current blood sugar level (mg/dL)?", float),
-        ("Is this a fasting reading or post-meal? (fasting/post)", str),
-        ("Have you taken your medication today? (yes/no)", str),
-        ("Did you consume any sugary or high-carb food today? (yes/no)", str),
-        ("Have you exercised today? (yes/no)", str),
-        ("How many hours did you sleep last night?", int),
-        ("Do you feel any symptoms like fatigue, thirst, or blurred vision? (yes/no)", str),
-        ("Did you monitor your sugar level at the same time as yesterday? (yes/no)", str)
-    ]
-    
-    responses = {}
+    values = []
     print("\nPlease answer the following questions about your health:\n")
-    for question, dtype in questions:
+    for field in DIABETES.fields:
         while True:
             try:
-                response = input(f"{question} ").strip().lower()
-                responses[question] = dtype(response) if dtype != str else response
+                value = field.parse(input(f"{field.question} "))
+                if value is None and field.required:
+                    raise ValueError("an answer is required")
+                values.append(value)
                 break
-            except ValueError:
-                print("Please enter a valid response.")
+            except ValueError as e:
+                print(f"Please enter a valid response ({str(e)}).")
     
-    return responses
+    return DIABETES.record_class(*values)
 
-def analyze_diabetes_data(data):
+def analyze_diabetes_data(reading):
     prompt = (
         "Analyze the following diabetes-related data and provide short dietary advice, "
         "warnings if needed, and daily wellness tips within 80 words:\n\n"
     )
     
-    for key, value in data.items():
-        prompt += f"- {key}: {value}\n"
+    for question, value in reading.to_answers().items():
+        prompt += f"- {question}: {value}\n"
 
-    response = client.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
+    return get_client().complete(
+        [{"role": "user", "content": prompt}],
         model=DIABETES_MODEL,
-        temperature=0.3
+        temperature=0.3,
+        max_tokens=None
     )
-    
-    return response.choices[0].message.content
 
-def store_diabetes_data(data, analysis):
+def store_diabetes_data(reading, analysis):
     entry = {
         "timestamp": datetime.now().isoformat(),
-        "data": data,
+        "data": reading.to_answers(),
         "analysis": analysis
     }
     
-    with open("diabetes_records.json", "a") as f:
+    with open(DIABETES_RECORDS, "a") as f:
         f.write(json.dumps(entry) + "\n")
 
 if __name__ == "__main__":
-    print("🩺 HealthSync Diabetes Monitoring System\n")
-    data = ask_diabetes_questions()
-    analysis = analyze_diabetes_data(data)
-    store_diabetes_data(data, analysis)
-    print("\n📋 Analysis:\n", analysis)
+    parser = argparse.ArgumentParser(description="HealthSync Diabetes Monitoring System")
+    add_batch_arguments(parser, DIABETES_RECORDS)
+    args = parser.parse_args()
+
+    if args.batch:
+        # e.g. python dia.py --batch readings.csv --concurrency 16
+        counts = run_batch(args.batch, DIABETES, analyze_diabetes_data, args.records,
+                           concurrency=args.concurrency, fresh=args.fresh,
+                           checkpoint_every=args.checkpoint_every)
+        print("\n📋 Batch complete:", ", ".join(f"{count} {name}" for name, count in counts.items()))
+    else:
+        print("🩺 HealthSync Diabetes Monitoring System\n")
+        data = ask_diabetes_questions()
+        analysis = analyze_diabetes_data(data)
+        store_diabetes_data(data, analysis)
+        print("\n📋 Analysis:\n", analysis)
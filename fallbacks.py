@@ -0,0 +1,63 @@
+# fallbacks.py
+"""Templated local replies used when Groq can't be reached.
+
+The analyses are built from the rule-based classification in risk_engine,
+so patients still get their category, risk level and the key safety advice
+right away while the AI assistant is unavailable.
+"""
+
+UNAVAILABLE = "ℹ️ Our AI assistant is temporarily unavailable, so this is a quick automatic summary."
+
+GENERAL_FALLBACK = (
+    "I'm having trouble reaching the AI assistant right now. Please try again in a few minutes.\n\n"
+    "ℹ️ You can still record readings by typing \"diabetes\" or \"blood pressure\".\n"
+    "🚨 If you have severe symptoms such as chest pain, trouble breathing or confusion, "
+    "contact emergency services immediately."
+)
+
+RISK_ICONS = {
+    'low': '✅',
+    'medium': 'ℹ️',
+    'high': '⚠️',
+    'critical': '🚨'
+}
+
+GLUCOSE_ADVICE = {
+    'severe_hypoglycemia': "🚨 This is dangerously low. Take 15-20 g of fast-acting sugar now, recheck in 15 minutes and seek emergency care if you don't improve.",
+    'hypoglycemia': "⚠️ This is low. Have 15 g of fast-acting sugar and recheck in 15 minutes.",
+    'normal': "✅ This is in the normal range. Keep up your current routine.",
+    'prediabetes': "📝 This is above the normal range. Regular activity and fewer sugary or high-carb foods can help.",
+    'diabetes': "⚠️ This is high. Take your medication as prescribed, drink water and mention this reading to your doctor.",
+    'severe_hyperglycemia': "🚨 This is very high. Contact your doctor today, and seek urgent care if you feel very thirsty, confused or sick."
+}
+
+BP_ADVICE = {
+    'normal': "✅ Your blood pressure is in the normal range.",
+    'elevated': "📝 Your blood pressure is elevated. Reducing salt, staying active and managing stress can help.",
+    'hypotension': "⚠️ Your blood pressure is low. Sit or lie down if you feel dizzy and drink some water.",
+    'stage_1': "⚠️ This is stage 1 hypertension. Take your medication as prescribed and keep monitoring.",
+    'stage_2': "⚠️ This is stage 2 hypertension. Please contact your doctor about this reading.",
+    'crisis': "🚨 This is a hypertensive crisis. Rest for 5 minutes and measure again; if it stays this high or you have chest pain, shortness of breath or vision changes, seek emergency care now."
+}
+
+
+def _label(category):
+    return category.replace('_', ' ')
+
+
+def diabetes_fallback(sugar_level, reading_type, category, risk_level):
+    return "\n\n".join([
+        UNAVAILABLE,
+        f"{RISK_ICONS[risk_level]} Blood sugar: {sugar_level:g} mg/dL ({reading_type}) - {_label(category)}, {risk_level} risk",
+        GLUCOSE_ADVICE[category],
+        "🎯 Target: 70-100 mg/dL fasting, under 140 mg/dL after meals."
+    ])
+
+
+def hypertension_fallback(systolic, diastolic, category, risk_level):
+    return "\n\n".join([
+        UNAVAILABLE,
+        f"{RISK_ICONS[risk_level]} Blood pressure: {systolic:g}/{diastolic:g} mmHg - {_label(category)}, {risk_level} risk",
+        BP_ADVICE[category],
+        "🎯 Target: below 120/80 mmHg."
+    ])
@@ -0,0 +1,87 @@
+# file_index.py
+"""Shared-file records with a change sequence for incremental sync.
+
+Records are persisted in a StateBackend. Every add or update gets a new,
+increasing `seq` (the backend version) and moves to the end of this
+process's change log, so "what changed since seq N" is a binary search plus
+a slice instead of a full listing. Changes made by other workers are pulled
+in before every read.
+"""
+import threading
+from bisect import bisect_right
+
+from state_backend import MemoryBackend
+
+COLLECTION = 'files'
+
+
+class FileIndex:
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend()
+        self._by_id = {}
+        self._log = []    # records ordered by seq
+        self._seqs = []   # seq of each entry in _log, for bisect
+        self._lock = threading.RLock()
+        self.last_seq = 0
+        self.sync()
+
+    def __len__(self):
+        self.sync()
+        return len(self._by_id)
+
+    def sync(self):
+        """Apply changes made through the backend (by any worker) since the last sync"""
+        with self._lock:
+            changes, version = self.backend.changes_since(COLLECTION, self.last_seq)
+            for seq, record in changes:
+                self._append(seq, record)
+            self.last_seq = version
+
+    def _append(self, seq, record):
+        old = self._by_id.get(record['id'])
+        if old is not None:
+            index = bisect_right(self._seqs, old['seq']) - 1
+            del self._log[index]
+            del self._seqs[index]
+        record['seq'] = seq
+        self._by_id[record['id']] = record
+        self._log.append(record)
+        self._seqs.append(seq)
+
+    def add(self, record):
+        """Insert or replace a record and return the stored copy with its new seq"""
+        with self._lock:
+            stored = {key: value for key, value in record.items() if key != 'seq'}
+            self.backend.put(COLLECTION, record['id'], stored)
+            self.sync()
+            return self._by_id[record['id']]
+
+    def get(self, file_id):
+        self.sync()
+        return self._by_id.get(file_id)
+
+    def all(self):
+        with self._lock:
+            self.sync()
+            return list(self._log)
+
+    def changes(self, since=0, category=None, uploaded_by=None, limit=100):
+        """Records changed after seq `since` matching the filters.
+
+        Returns (records, cursor, has_more). Pass cursor back as `since` to get
+        the next page, or the next batch of changes once has_more is False.
+        """
+        results = []
+        with self._lock:
+            self.sync()
+            start = bisect_right(self._seqs, since)
+            cursor = self.last_seq
+            for record in self._log[start:]:
+                if category is not None and record.get('category') != category:
+                    continue
+                if uploaded_by is not None and record.get('uploaded_by') != uploaded_by:
+                    continue
+                if len(results) == limit:
+                    return results, results[-1]['seq'], True
+                results.append(record)
+        return results, cursor, False
@@ -0,0 +1,201 @@
+# file_search.py
+"""Full-text search over shared files.
+
+After an upload the file's text is extracted in a worker process (PDFs need
+the optional PyMuPDF; DOCX is read with the standard library) and written to
+an on-disk SQLite FTS5 index together with the file's name, description,
+category and upload month. Each file is one row, replaced when it is
+re-indexed, so the index is updated incrementally and never rebuilt.
+Searches are ranked with BM25, matches in the name and description
+weighing more than matches in the body.
+
+Other file types (images, legacy .doc) are searchable by their metadata only.
+"""
+import importlib.util
+import re
+import sqlite3
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from xml.etree import ElementTree
+
+from db import ThreadConnections
+from lazy import Lazy
+
+PDF_TYPES = {'pdf'}
+DOCX_TYPES = {'docx'}
+
+HAS_PYMUPDF = importlib.util.find_spec('pymupdf') is not None
+
+# Long documents are cut off here; the first pages are what people search for
+MAX_TEXT_CHARS = 1000000
+
+# documents maps file ids to FTS rowids, so replacing a file's row is a
+# primary-key lookup rather than a scan of the full-text table
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    file_id TEXT UNIQUE NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS file_text USING fts5(
+    name, description, category, uploaded, body,
+    tokenize = 'porter unicode61'
+);
+"""
+
+# BM25 weights per column: name, description, category, uploaded, body
+WEIGHTS = (10.0, 5.0, 2.0, 2.0, 1.0)
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+DOCX_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def can_extract(file_type):
+    if file_type in PDF_TYPES:
+        return HAS_PYMUPDF
+    return file_type in DOCX_TYPES
+
+
+def extract_text(path, file_type):
+    """Plain text of a PDF or DOCX file, '' for other types (runs in a worker process)"""
+    if not can_extract(file_type):
+        return ''
+
+    parts = []
+    size = 0
+    if file_type in PDF_TYPES:
+        import pymupdf
+
+        with pymupdf.open(path) as document:
+            for page in document:
+                text = page.get_text()
+                parts.append(text)
+                size += len(text)
+                if size >= MAX_TEXT_CHARS:
+                    break
+    else:
+        # word/document.xml: <w:p> paragraphs made of <w:t> runs
+        with zipfile.ZipFile(path) as archive, archive.open('word/document.xml') as f:
+            paragraph = []
+            for _, element in ElementTree.iterparse(f):
+                if element.tag == DOCX_NS + 't' and element.text:
+                    paragraph.append(element.text)
+                elif element.tag == DOCX_NS + 'p':
+                    text = ''.join(paragraph)
+                    parts.append(text)
+                    size += len(text)
+                    paragraph = []
+                    element.clear()
+                    if size >= MAX_TEXT_CHARS:
+                        break
+    return '\n'.join(parts)[:MAX_TEXT_CHARS]
+
+
+def upload_month(upload_date):
+    """'2025-03-14T...' -> '2025-03-14 March 2025', so "march" finds it"""
+    try:
+        date = datetime.fromisoformat(upload_date)
+    except (TypeError, ValueError):
+        return ''
+    return date.strftime('%Y-%m-%d %B %Y')
+
+
+def match_query(text):
+    """User input -> FTS5 query: every word must match, the last one as a prefix"""
+    words = WORD.findall(text.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class FileSearch:
+    def __init__(self, path, workers=1, executor=None):
+        self.path = path
+        self.workers = workers
+        # Worker processes are only started once there is something to extract
+        self._executor = Lazy('search workers', lambda: executor or ProcessPoolExecutor(max_workers=workers))
+        self._db = ThreadConnections(path)
+        self._write_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = 0
+        with self._db.get() as conn:
+            conn.executescript(SCHEMA)
+
+    def submit(self, record, on_done=None):
+        """Extract and index a file record in the background; returns right away.
+
+        on_done(file_id) is called once the file is searchable.
+        """
+        with self._pending_lock:
+            self._pending += 1
+        future = self._executor.submit(extract_text, record['path'], record['file_type'])
+
+        def finished(f):
+            with self._pending_lock:
+                self._pending -= 1
+            if f.exception() is not None:
+                print(f"Text extraction failed for {record['path']}: {f.exception()}")
+                body = ''  # Still searchable by name
+            else:
+                body = f.result()
+            try:
+                self.index(record, body)
+            except sqlite3.Error as e:
+                print(f"Indexing failed for {record['id']}: {str(e)}")
+                return
+            if on_done is not None:
+                on_done(record['id'])
+
+        future.add_done_callback(finished)
+
+    def index(self, record, body=''):
+        """Insert or replace the index row for a file record"""
+        row = (record.get('original_name', ''), record.get('description', ''),
+               record.get('category', ''), upload_month(record.get('upload_date')), body)
+        with self._write_lock, self._db.get() as conn:
+            existing = conn.execute("SELECT id FROM documents WHERE file_id = ?", (record['id'],)).fetchone()
+            if existing is None:
+                doc_id = conn.execute("INSERT INTO documents (file_id) VALUES (?)", (record['id'],)).lastrowid
+            else:
+                doc_id = existing[0]
+                conn.execute("DELETE FROM file_text WHERE rowid = ?", (doc_id,))
+            conn.execute("INSERT INTO file_text (rowid, name, description, category, uploaded, body) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", (doc_id,) + row)
+
+    def remove(self, file_id):
+        with self._write_lock, self._db.get() as conn:
+            existing = conn.execute("SELECT id FROM documents WHERE file_id = ?", (file_id,)).fetchone()
+            if existing is not None:
+                conn.execute("DELETE FROM file_text WHERE rowid = ?", existing)
+                conn.execute("DELETE FROM documents WHERE id = ?", existing)
+
+    def indexed_ids(self):
+        return {row[0] for row in self._db.get().execute("SELECT file_id FROM documents")}
+
+    def search(self, text, limit=20):
+        """[(file_id, score, snippet)] best first; higher scores are better matches"""
+        query = match_query(text)
+        if query is None:
+            return []
+        rows = self._db.get().execute(
+            f"SELECT documents.file_id, bm25(file_text, {', '.join(map(str, WEIGHTS))}) AS rank, "
+            "snippet(file_text, -1, '[', ']', '…', 12) "
+            "FROM file_text JOIN documents ON documents.id = file_text.rowid "
+            "WHERE file_text MATCH ? ORDER BY rank LIMIT ?",
+            (query, int(limit)))
+        # bm25() is lower-is-better; flip it so clients can sort descending
+        return [(file_id, round(-rank, 4), snippet) for file_id, rank, snippet in rows]
+
+    def stats(self):
+        return {
+            'documents': self._db.get().execute("SELECT COUNT(*) FROM documents").fetchone()[0],
+            'pending': self._pending
+        }
+
+    def shutdown(self):
+        if self._executor.built:
+            self._executor.shutdown(wait=False, cancel_futures=True)
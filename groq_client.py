@@ -0,0 +1,102 @@
+# groq_client.py
+"""Shared, pooled HTTP client for the Groq chat completions API.
+
+app.py, dia.py and hyper.py all talk to Groq through the same client so the
+URL, model, headers and connection pool are configured in one place.
+"""
+import json
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama3-8b-8192")
+
+# Connection pool and timeout settings (seconds)
+GROQ_POOL_SIZE = int(os.getenv("GROQ_POOL_SIZE", "10"))
+GROQ_CONNECT_TIMEOUT = float(os.getenv("GROQ_CONNECT_TIMEOUT", "3.05"))
+GROQ_READ_TIMEOUT = float(os.getenv("GROQ_READ_TIMEOUT", "30"))
+
+
+class GroqClient:
+    """Keep-alive client that reuses TCP/TLS connections across calls"""
+
+    def __init__(self, api_key=None, url=GROQ_API_URL, model=GROQ_MODEL,
+                 pool_size=GROQ_POOL_SIZE, connect_timeout=GROQ_CONNECT_TIMEOUT,
+                 read_timeout=GROQ_READ_TIMEOUT):
+        self.api_key = api_key if api_key is not None else os.getenv("GROQ_API_KEY")
+        self.url = url
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Connection": "keep-alive"
+        })
+
+    def post(self, messages, model=None, temperature=0.5, max_tokens=200, timeout=None,
+             stream=False, **extra):
+        """Send a chat completion request and return the raw response"""
+        data = {
+            "model": model or self.model,
+            "messages": messages,
+            "temperature": temperature
+        }
+        if max_tokens is not None:
+            data["max_tokens"] = max_tokens
+        if stream:
+            data["stream"] = True
+        data.update(extra)
+
+        return self.session.post(self.url, json=data, timeout=timeout or self.timeout, stream=stream)
+
+    def complete(self, messages, **kwargs):
+        """Send a chat completion request and return the message content"""
+        response = self.post(messages, **kwargs)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    def stream(self, messages, **kwargs):
+        """Send a streaming chat completion request and yield content chunks as they arrive"""
+        response = self.post(messages, stream=True, **kwargs)
+        try:
+            response.raise_for_status()
+            # Server-sent events: one "data: {...}" line per chunk, ending with "data: [DONE]"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                delta = json.loads(payload)["choices"][0].get("delta", {})
+                if delta.get("content"):
+                    yield delta["content"]
+        finally:
+            response.close()
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide GroqClient, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GroqClient()
+    return _client
@@ -0,0 +1,50 @@
+# http_cache.py
+"""Helpers for conditional GETs (ETag / If-None-Match) and compressed JSON."""
+import gzip
+import hashlib
+
+from flask import request, jsonify, make_response
+
+
+def make_etag(*parts):
+    """Stable ETag value from the parts that determine a response"""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+# Bodies smaller than this aren't worth compressing
+GZIP_MIN_SIZE = 1024
+
+
+def conditional_json(etag, build_payload, status=200, compress=False):
+    """Return 304 if the client already has etag, otherwise the JSON from build_payload().
+
+    build_payload is only called when the body is actually needed. With
+    compress=True the body is gzipped for clients that accept it.
+    """
+    if compress and 'gzip' in request.accept_encodings:
+        # Different representation, different validator
+        etag += '-gzip'
+
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(jsonify(build_payload()), status)
+        if compress:
+            gzip_response(response)
+    response.set_etag(etag)
+    return response
+
+
+def gzip_response(response):
+    """Compress a response body in place if the client accepts gzip"""
+    response.vary.add('Accept-Encoding')
+    if 'gzip' not in request.accept_encodings or response.direct_passthrough:
+        return response
+
+    body = response.get_data()
+    if len(body) < GZIP_MIN_SIZE:
+        return response
+
+    response.set_data(gzip.compress(body, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
@@ -1,68 +1,71 @@
 # hypertension_monitor.py
-from groq import Groq
+import argparse
 import json
 from datetime import datetime
+from groq_client import get_client, GROQ_MODEL
+from batch_runner import add_batch_arguments, run_batch
+from reading_schema import HYPERTENSION  # Questions and answer types, shared with app.py
 
-api_key = os.getenv("GROQ_API_KEY")
-HYPERTENSION_MODEL = "llama3-8b-8192"  # Changed to a faster model
+HYPERTENSION_MODEL = GROQ_MODEL  # Shared with app.py via groq_client
+HYPERTENSION_RECORDS = "hypertension_records.json"
 
 def ask_hypertension_questions():
-    questions = [
-        ("What is your systolic blood pressure (upper number)?", int),
-        ("What is your diastolic blood pressure (lower number)?", int),
-        ("Have you experienced any dizziness or headaches? (yes/no)", str),
-        ("Have you taken hypertension medication?", str),
-        ("Did you exercise today? ", str),
-        ("How many hours did you sleep last night?", int),
-        ("Have you been feeling stressed lately? (yes/no)", str),
-        ("Did you consume salty or processed foods today? (yes/no)", str),
-        ("How much water have you consumed today? (in liters)", float)
-    ]
-    
-    responses = {}
+    values = []
     print("\nPlease answer the following questions about your health:\n")
-    for question, dtype in questions:
+    for field in HYPERTENSION.fields:
         while True:
             try:
-                response = input(f"{question} ").strip().lower()
-                responses[question] = dtype(response) if dtype != str else response
+                value = field.parse(input(f"{field.question} "))
+                if value is None and field.required:
+                    raise ValueError("an answer is required")
+                values.append(value)
                 break
-            except ValueError:
-                print("Please enter a valid response.")
+            except ValueError as e:
+                print(f"Please enter a valid response ({str(e)}).")
     
-    return responses
+    return HYPERTENSION.record_class(*values)
 
-def analyze_hypertension_data(data):
+def analyze_hypertension_data(reading):
     # Create a structured analysis prompt
     prompt = (
         "Analyze the following hypertension-related data and provide a personalized "
         "assessment, lifestyle tips, and warnings (if necessary) within 80 words:\n\n"
     )
 
-    for key, value in data.items():
-        prompt += f"- {key}: {value}\n"
+    for question, value in reading.to_answers().items():
+        prompt += f"- {question}: {value}\n"
 
-    response = client.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
+    return get_client().complete(
+        [{"role": "user", "content": prompt}],
         model=HYPERTENSION_MODEL,
-        temperature=0.3
+        temperature=0.3,
+        max_tokens=None
     )
-    
-    return response.choices[0].message.content
 
-def store_hypertension_data(data, analysis):
+def store_hypertension_data(reading, analysis):
     entry = {
         "timestamp": datetime.now().isoformat(),
-        "data": data,
+        "data": reading.to_answers(),
         "analysis": analysis
     }
     
-    with open("hypertension_records.json", "a") as f:
+    with open(HYPERTENSION_RECORDS, "a") as f:
         f.write(json.dumps(entry) + "\n")
 
 if __name__ == "__main__":
-    print("🩺 HealthSync Hypertension Monitoring System\n")
-    data = ask_hypertension_questions()
-    analysis = analyze_hypertension_data(data)
-    store_hypertension_data(data, analysis)
-    print("\n📋 Analysis:\n", analysis)
+    parser = argparse.ArgumentParser(description="HealthSync Hypertension Monitoring System")
+    add_batch_arguments(parser, HYPERTENSION_RECORDS)
+    args = parser.parse_args()
+
+    if args.batch:
+        # e.g. python hyper.py --batch readings.csv --concurrency 16
+        counts = run_batch(args.batch, HYPERTENSION, analyze_hypertension_data, args.records,
+                           concurrency=args.concurrency, fresh=args.fresh,
+                           checkpoint_every=args.checkpoint_every)
+        print("\n📋 Batch complete:", ", ".join(f"{count} {name}" for name, count in counts.items()))
+    else:
+        print("🩺 HealthSync Hypertension Monitoring System\n")
+        data = ask_hypertension_questions()
+        analysis = analyze_hypertension_data(data)
+        store_hypertension_data(data, analysis)
+        print("\n📋 Analysis:\n", analysis)
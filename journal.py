@@ -0,0 +1,216 @@
+# journal.py
+"""Append-only journal with group commit and compact snapshots.
+
+Mutations are queued by the caller and written by a single background
+thread: it takes everything queued so far, writes it as JSON lines and does
+one fsync for the whole group, so requests never wait on disk I/O.
+
+Every `snapshot_every` entries the caller hands over a full copy of its
+state. The writer stores it as one compact JSON file, starts a new journal
+segment and deletes the segments the snapshot covers. Recovery loads the
+newest snapshot and replays only the journal tail after it.
+
+Only one process may use a journal directory: segment names and seqs are
+per process, and one writer's snapshot deletes segments another still
+needs. The directory is locked while a Journal is open, and a second one
+fails with JournalLocked (several workers should share the SQLite backend
+instead).
+
+Files in the journal directory:
+    snapshot-<seq>.json   state after entry <seq>
+    journal-<seq>.log     entries starting at <seq>
+    lock                  held by the process using the journal
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, run a single process
+    fcntl = None
+
+_STOP = object()
+
+
+class JournalLocked(RuntimeError):
+    """Raised when another process already uses the journal directory"""
+
+
+def _dump(value):
+    return json.dumps(value, separators=(',', ':'))
+
+
+class Journal:
+    def __init__(self, directory, snapshot_every=10000):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = self._lock(directory)
+
+        self.last_seq = 0
+        self._since_snapshot = 0
+        self._queue = queue.Queue()
+        self._segment = None
+        self._writer = None
+
+    @staticmethod
+    def _lock(directory):
+        if fcntl is None:
+            return None
+        lock_file = open(os.path.join(directory, 'lock'), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise JournalLocked(
+                f"Journal directory {directory} is in use by another process; give each process its "
+                f"own STATE_JOURNAL_DIR, or use STATE_BACKEND=sqlite for several workers")
+        return lock_file
+
+    # ---- recovery ----
+
+    def _files(self, prefix, suffix):
+        found = []
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name.endswith(suffix):
+                try:
+                    found.append((int(name[len(prefix):-len(suffix)]), name))
+                except ValueError:
+                    continue
+        return sorted(found)
+
+    def recover(self):
+        """Return (snapshot_state or None, tail entries) and start the writer.
+
+        Must be called once, before the first append().
+        """
+        state = None
+        snapshot_seq = 0
+        snapshots = self._files('snapshot-', '.json')
+        if snapshots:
+            snapshot_seq, name = snapshots[-1]
+            with open(os.path.join(self.directory, name)) as f:
+                state = json.load(f)
+
+        entries = []
+        for _, name in self._files('journal-', '.log'):
+            path = os.path.join(self.directory, name)
+            good_bytes = 0
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    good_bytes += len(line)
+                    if entry['seq'] > snapshot_seq:
+                        entries.append(entry)
+            # Drop a torn write at the tail of a crashed segment so appends stay parseable
+            if good_bytes < os.path.getsize(path):
+                with open(path, 'r+b') as f:
+                    f.truncate(good_bytes)
+
+        self.last_seq = entries[-1]['seq'] if entries else snapshot_seq
+        self._since_snapshot = len(entries)
+        self._start_writer()
+        return state, entries
+
+    # ---- writing ----
+
+    def append(self, entry):
+        """Stamp entry with the next seq and queue it for writing.
+
+        Callers must serialize append() calls (e.g. under their own lock) so
+        seq order matches the order of the mutations.
+        """
+        self.last_seq += 1
+        self._since_snapshot += 1
+        entry['seq'] = self.last_seq
+        self._queue.put(('entry', entry))
+        return self.last_seq
+
+    def should_snapshot(self):
+        return self._since_snapshot >= self.snapshot_every
+
+    def snapshot(self, state):
+        """Queue a snapshot of state as of the last appended entry"""
+        self._since_snapshot = 0
+        self._queue.put(('snapshot', (self.last_seq, state)))
+
+    def close(self):
+        if self._writer is not None:
+            self._queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+        if self._lock_file is not None:
+            self._lock_file.close()  # releases the lock
+            self._lock_file = None
+
+    def _start_writer(self):
+        self._writer = threading.Thread(target=self._run, daemon=True)
+        self._writer.start()
+        # Flush whatever is still queued on a normal interpreter exit
+        atexit.register(self.close)
+
+    def _open_segment(self, start_seq):
+        path = os.path.join(self.directory, f"journal-{start_seq}.log")
+        self._segment = open(path, 'a')
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # Group commit: take everything that queued up during the last fsync
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            pending = False
+            for item in batch:
+                if item is _STOP:
+                    self._commit(pending)
+                    if self._segment is not None:
+                        self._segment.close()
+                    return
+
+                kind, payload = item
+                if kind == 'entry':
+                    if self._segment is None:
+                        self._open_segment(payload['seq'])
+                    self._segment.write(_dump(payload) + '\n')
+                    pending = True
+                else:
+                    self._commit(pending)
+                    pending = False
+                    self._write_snapshot(*payload)
+
+            self._commit(pending)
+
+    def _commit(self, pending):
+        if pending and self._segment is not None:
+            self._segment.flush()
+            os.fsync(self._segment.fileno())
+
+    def _write_snapshot(self, seq, state):
+        path = os.path.join(self.directory, f"snapshot-{seq}.json")
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(_dump(state))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        # Everything written so far is covered by the snapshot
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        for old_seq, name in self._files('journal-', '.log'):
+            os.remove(os.path.join(self.directory, name))
+        for old_seq, name in self._files('snapshot-', '.json'):
+            if old_seq < seq:
+                os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,68 @@
+# lazy.py
+"""Services that are built the first time they are used.
+
+    reading_store = Lazy('reading_store', lambda: ReadingStore(path))
+    reading_store.add(...)   # opens the database here, once
+
+A Lazy stands in for the object its factory returns: attribute access,
+len(), iteration and `in` are forwarded to it, building it on first use.
+Concurrent first users wait for the one build. A worker that never serves
+uploads never opens the search index; one that never chats never starts
+the LLM pool.
+
+`built` tells whether the object exists yet, so cleanup and metrics can
+skip services a process never touched, and `seconds` is how long the
+build took, for the startup benchmark and /metrics.
+"""
+import threading
+import time
+
+_UNSET = object()
+
+
+class Lazy:
+    __slots__ = ('_name', '_factory', '_value', '_lock', '_seconds')
+
+    def __init__(self, name, factory):
+        self._name = name
+        self._factory = factory
+        self._value = _UNSET
+        self._lock = threading.Lock()
+        self._seconds = None
+
+    @property
+    def built(self):
+        return self._value is not _UNSET
+
+    @property
+    def seconds(self):
+        return self._seconds
+
+    def resolve(self):
+        """The real object, built now if this is the first use"""
+        value = self._value
+        if value is _UNSET:
+            with self._lock:
+                if self._value is _UNSET:
+                    started = time.perf_counter()
+                    self._value = self._factory()
+                    self._seconds = time.perf_counter() - started
+                    print(f"Initialized {self._name} in {self._seconds * 1000:.1f} ms")
+                value = self._value
+        return value
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+    def __len__(self):
+        return len(self.resolve())
+
+    def __iter__(self):
+        return iter(self.resolve())
+
+    def __contains__(self, item):
+        return item in self.resolve()
+
+    def __repr__(self):
+        state = 'built' if self.built else 'not built'
+        return f"<Lazy {self._name} ({state})>"
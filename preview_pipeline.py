@@ -0,0 +1,92 @@
+# preview_pipeline.py
+"""Background thumbnail / first-page preview generation for uploaded files.
+
+Previews are rendered in a process pool so image decoding never runs on a
+request thread. Images need Pillow and PDFs need PyMuPDF; both are optional
+and file types without a renderer simply get no preview.
+"""
+import importlib.util
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from lazy import Lazy
+
+PREVIEW_SIZE = (320, 320)
+PREVIEW_EXT = 'jpg'
+
+IMAGE_TYPES = {'png', 'jpg', 'jpeg'}
+PDF_TYPES = {'pdf'}
+
+HAS_PILLOW = importlib.util.find_spec('PIL') is not None
+HAS_PYMUPDF = importlib.util.find_spec('pymupdf') is not None
+
+
+def can_preview(file_type):
+    if file_type in IMAGE_TYPES:
+        return HAS_PILLOW
+    if file_type in PDF_TYPES:
+        return HAS_PILLOW and HAS_PYMUPDF
+    return False
+
+
+def render_preview(source_path, target_path, file_type):
+    """Write a JPEG thumbnail of source_path to target_path (runs in a worker process)"""
+    from PIL import Image
+
+    if file_type in PDF_TYPES:
+        import pymupdf
+
+        with pymupdf.open(source_path) as document:
+            pixmap = document[0].get_pixmap(dpi=72)
+            image = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+    else:
+        image = Image.open(source_path)
+
+    image.thumbnail(PREVIEW_SIZE)
+    tmp_path = f"{target_path}.{os.getpid()}.tmp"
+    image.convert('RGB').save(tmp_path, 'JPEG', quality=80, optimize=True)
+    os.replace(tmp_path, target_path)
+    return os.path.basename(target_path)
+
+
+class PreviewPipeline:
+    def __init__(self, preview_dir, workers=2, executor=None):
+        self.preview_dir = preview_dir
+        self.workers = workers
+        # Worker processes are only started once there is something to render
+        self._executor = Lazy('preview workers', lambda: executor or ProcessPoolExecutor(max_workers=workers))
+        os.makedirs(preview_dir, exist_ok=True)
+
+    def preview_name(self, sha256):
+        return f"{sha256}.{PREVIEW_EXT}"
+
+    def submit(self, source_path, sha256, file_type, on_done=None):
+        """Queue a preview render; on_done(preview_filename) is called when it is ready.
+
+        Returns False if no preview can be made for this file type. Previews
+        are keyed by content hash, so duplicate uploads reuse the existing one.
+        """
+        if not can_preview(file_type):
+            return False
+
+        name = self.preview_name(sha256)
+        target_path = os.path.join(self.preview_dir, name)
+        if os.path.exists(target_path):
+            if on_done is not None:
+                on_done(name)
+            return True
+
+        future = self._executor.submit(render_preview, source_path, target_path, file_type)
+
+        def finished(f):
+            if f.exception() is not None:
+                print(f"Preview failed for {source_path}: {f.exception()}")
+            elif on_done is not None:
+                on_done(f.result())
+
+        future.add_done_callback(finished)
+        return True
+
+    def shutdown(self):
+        if self._executor.built:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,140 @@
+# prompts.py
+"""Versioned prompt templates for the reading analyses.
+
+Templates are compiled once at import into literal text and the reading
+fields to fill in, so rendering a prompt is a single join. Each template
+has its own output budget (max_tokens) sized to what it asks for, and a
+`verbose` and a `compact` variant; PROMPT_VARIANT in app.py picks one, or
+splits users between them ('ab') to compare latency and cost.
+
+Placeholders are reading_schema field names, e.g. {sugar_level}; a typo is
+caught at import.
+"""
+import zlib
+from string import Formatter
+
+from rate_limiter import estimate_tokens
+from reading_schema import DIABETES, HYPERTENSION
+
+VARIANTS = ('verbose', 'compact')
+
+
+class PromptTemplate:
+    def __init__(self, name, variant, version, text, max_tokens, schema):
+        self.name = name
+        self.variant = variant
+        self.version = version
+        self.max_tokens = max_tokens
+        self.id = f"{name}.{variant}.v{version}"
+
+        # [(literal text, field name or None)]
+        self._parts = [(literal, field) for literal, field, _, _ in Formatter().parse(text)]
+        names = {field.name for field in schema.fields}
+        unknown = {field for _, field in self._parts if field is not None} - names
+        if unknown:
+            raise ValueError(f"{self.id}: unknown fields {sorted(unknown)}")
+
+        # Prompt size without the answers, for rate limiting before rendering
+        self.base_tokens = estimate_tokens(''.join(literal for literal, _ in self._parts))
+
+    def render(self, reading):
+        out = []
+        for literal, field in self._parts:
+            out.append(literal)
+            if field is not None:
+                out.append(reading.format(field))
+        return ''.join(out)
+
+    def estimated_tokens(self):
+        """Prompt plus answer budget, a little over for the filled-in fields"""
+        return self.base_tokens + len(self._parts) * 2 + self.max_tokens
+
+
+DIABETES_VERBOSE = """As a healthcare AI assistant, analyze the following diabetes monitoring data and provide a detailed assessment with recommendations:
+
+Blood Sugar Reading:
+- Current Level: {sugar_level} mg/dL
+- Reading Type: {reading_type}
+- Taken at same time as yesterday: {same_time}
+
+Lifestyle Factors:
+- Medication taken: {medication}
+- High-carb food consumed: {high_carb_food}
+- Exercise today: {exercised}
+- Sleep hours: {sleep_hours}
+- Symptoms present: {symptoms}
+
+Please provide:
+1. Analysis of blood sugar level (including whether it's in normal, pre-diabetic, or diabetic range)
+2. Risk assessment
+3. Specific recommendations based on the lifestyle factors
+4. Any warning signs that need immediate attention
+5. Tips for better management
+
+Format the response with appropriate emoji indicators:
+⚠️ for warnings
+✅ for normal/good readings
+ℹ️ for informational points
+🎯 for targets
+📝 for recommendations"""
+
+DIABETES_COMPACT = """Diabetes check-in. Glucose {sugar_level} mg/dL ({reading_type}); same time as yesterday: {same_time}; medication: {medication}; high-carb food: {high_carb_food}; exercise: {exercised}; sleep: {sleep_hours} h; fatigue/thirst/blurred vision: {symptoms}.
+In under 100 words give: the range (normal/prediabetic/diabetic) and risk, up to 3 recommendations, and any urgent warning. Start lines with ✅ ⚠️ 🎯 or 📝."""
+
+HYPERTENSION_VERBOSE = """As a healthcare AI assistant, analyze the following blood pressure monitoring data and provide a detailed assessment with recommendations:
+
+Blood Pressure Reading:
+- Systolic (upper number): {systolic} mmHg
+- Diastolic (lower number): {diastolic} mmHg
+
+Current Symptoms and Lifestyle Factors:
+- Experiencing dizziness/headaches: {symptoms}
+- Medication taken: {medication}
+- Exercise today: {exercised}
+- Sleep hours: {sleep_hours}
+- Stress level: {stressed}
+- Salty/processed food intake: {salty_food}
+- Water consumption: {water_liters} liters
+
+Please provide:
+1. Analysis of blood pressure (categorize as normal, elevated, Stage 1, Stage 2, or Crisis)
+2. Risk assessment
+3. Evaluation of lifestyle factors' impact
+4. Urgent warnings if needed
+5. Specific recommendations for improvement
+6. Hydration and dietary advice
+7. Stress management suggestions if needed
+
+Format the response with appropriate emoji indicators:
+🚨 for critical/emergency situations
+⚠️ for warnings
+✅ for normal/good readings
+ℹ️ for informational points
+🎯 for targets
+📝 for recommendations
+💧 for hydration advice
+🧘‍♀️ for stress management tips"""
+
+HYPERTENSION_COMPACT = """Blood pressure check-in. {systolic}/{diastolic} mmHg; dizziness/headaches: {symptoms}; medication: {medication}; exercise: {exercised}; sleep: {sleep_hours} h; stressed: {stressed}; salty food: {salty_food}; water: {water_liters} L.
+In under 100 words give: the category (normal/elevated/stage 1/stage 2/crisis) and risk, up to 3 recommendations, and any urgent warning. Start lines with 🚨 ✅ ⚠️ 🎯 📝 or 💧."""
+
+# Output budgets: the verbose prompts ask for 5-7 sections, the compact ones ~100 words
+TEMPLATES = {
+    ('diabetes', 'verbose'): PromptTemplate('diabetes_analysis', 'verbose', 1, DIABETES_VERBOSE, 600, DIABETES),
+    ('diabetes', 'compact'): PromptTemplate('diabetes_analysis', 'compact', 1, DIABETES_COMPACT, 220, DIABETES),
+    ('hypertension', 'verbose'): PromptTemplate('hypertension_analysis', 'verbose', 1, HYPERTENSION_VERBOSE, 700,
+                                                HYPERTENSION),
+    ('hypertension', 'compact'): PromptTemplate('hypertension_analysis', 'compact', 1, HYPERTENSION_COMPACT, 220,
+                                                HYPERTENSION)
+}
+
+
+def choose_variant(setting, key):
+    """'verbose', 'compact', or for 'ab' a stable 50/50 split by caller key"""
+    if setting in VARIANTS:
+        return setting
+    return VARIANTS[zlib.crc32(key.encode()) % 2]
+
+
+def get_template(condition, variant):
+    return TEMPLATES[(condition, variant)]
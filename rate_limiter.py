@@ -0,0 +1,194 @@
+# rate_limiter.py
+"""Token-bucket admission control for LLM traffic.
+
+Every Groq-bound request is charged against four buckets: requests and
+estimated tokens, for the caller and for the whole app. It is admitted only
+if all four have room, so one noisy client can't use up the shared quota.
+
+Priority lanes: NORMAL traffic (free-form chat) may not dip into the last
+`reserve` fraction of the global buckets. That headroom is kept for HIGH
+traffic (analyses, doctors), so they still get through when capacity is tight.
+
+With several worker processes, pass the shared state backend as `shared`:
+the global buckets are then kept there and updated atomically, so all
+workers draw on one Groq budget instead of one each. Per-caller buckets stay
+in each process.
+"""
+import math
+import threading
+import time
+
+from worker_pool import HIGH, NORMAL
+
+# Rough English average; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+# Where the global buckets are kept in a shared state backend
+SHARED_COLLECTION = 'rate_limits'
+SHARED_ID = 'global'
+
+
+def estimate_tokens(text):
+    return max(1, math.ceil(len(text or '') / CHARS_PER_TOKEN))
+
+
+class TokenBucket:
+    """`capacity` units, refilled continuously at `rate` units per second"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self._clock = clock
+        self.updated = clock()
+
+    def refill(self):
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, floor=0.0):
+        """Seconds until `amount` can be taken leaving at least `floor`; 0 if now"""
+        needed = amount + floor - self.level
+        if needed <= 0:
+            return 0.0
+        if amount + floor > self.capacity or self.rate <= 0:
+            return math.inf
+        return needed / self.rate
+
+    def take(self, amount):
+        self.level -= amount
+
+    def is_full(self):
+        return self.level >= self.capacity
+
+
+class Throttled:
+    """Why a request was refused and when to try again"""
+
+    def __init__(self, scope, limit, retry_after):
+        self.scope = scope            # 'user' or 'global'
+        self.limit = limit            # 'requests' or 'tokens'
+        self.retry_after = retry_after
+
+    def to_dict(self):
+        retry_after = None if math.isinf(self.retry_after) else math.ceil(self.retry_after * 10) / 10
+        return {'scope': self.scope, 'limit': self.limit, 'retry_after': retry_after}
+
+
+class RateLimiter:
+    def __init__(self, user_rpm=20, user_burst=5, user_tpm=8000,
+                 global_rpm=300, global_tpm=120000, reserve=0.2, shared=None, clock=time.monotonic):
+        self.user_rpm = user_rpm
+        self.user_burst = user_burst
+        self.user_tpm = user_tpm
+        self.reserve = reserve
+        self.shared = shared
+        self._clock = clock
+        self._global_limits = {'requests': (global_rpm / 60, global_rpm), 'tokens': (global_tpm / 60, global_tpm)}
+        self._global = {limit: TokenBucket(rate, capacity, clock)
+                        for limit, (rate, capacity) in self._global_limits.items()}
+        self._users = {}  # key -> {'requests': bucket, 'tokens': bucket}
+        self._lock = threading.Lock()
+        self._acquires = 0
+        self.throttled = {'user': 0, 'global': 0}
+
+    def _user_buckets(self, key):
+        buckets = self._users.get(key)
+        if buckets is None:
+            buckets = self._users[key] = {
+                'requests': TokenBucket(self.user_rpm / 60, self.user_burst, self._clock),
+                'tokens': TokenBucket(self.user_tpm / 60, self.user_tpm, self._clock)
+            }
+        return buckets
+
+    def _with_global(self, fn):
+        """fn(global buckets), refilled; in the shared backend, atomically across workers"""
+        if self.shared is None:
+            for bucket in self._global.values():
+                bucket.refill()
+            return fn(self._global)
+
+        def apply(record):
+            # Wall-clock time, since the buckets outlive this process
+            buckets = {}
+            for limit, (rate, capacity) in self._global_limits.items():
+                bucket = buckets[limit] = TokenBucket(rate, capacity, time.time)
+                if record and limit in record:
+                    bucket.level, bucket.updated = record[limit]
+                bucket.refill()
+            result = fn(buckets)
+            return {limit: [bucket.level, bucket.updated] for limit, bucket in buckets.items()}, result
+
+        return self.shared.update(SHARED_COLLECTION, SHARED_ID, apply)
+
+    def acquire(self, key, tokens, priority=NORMAL):
+        """Charge one request of `tokens` to key; returns None if admitted, else Throttled"""
+        cost = {'requests': 1, 'tokens': tokens}
+        with self._lock:
+            self._acquires += 1
+            if self._acquires % 1000 == 0:
+                self._prune()
+
+            user_buckets = self._user_buckets(key)
+            for bucket in user_buckets.values():
+                bucket.refill()
+
+            def admit(global_buckets):
+                checks = []
+                for limit, bucket in user_buckets.items():
+                    checks.append(('user', limit, bucket, 0.0))
+                for limit, bucket in global_buckets.items():
+                    floor = 0.0 if priority == HIGH else bucket.capacity * self.reserve
+                    checks.append(('global', limit, bucket, floor))
+
+                # All buckets must have room; report the one that frees up last
+                worst = None
+                for scope, limit, bucket, floor in checks:
+                    wait = bucket.wait_time(cost[limit], floor)
+                    if wait > 0 and (worst is None or wait > worst.retry_after):
+                        worst = Throttled(scope, limit, wait)
+                if worst is None:
+                    for _, limit, bucket, _ in checks:
+                        bucket.take(cost[limit])
+                return worst
+
+            worst = self._with_global(admit)
+            if worst is not None:
+                self.throttled[worst.scope] += 1
+            return worst
+
+    def refund(self, key, tokens):
+        """Give back a charge for a request that was admitted but never run"""
+        cost = {'requests': 1, 'tokens': tokens}
+
+        def give_back(buckets):
+            for limit, bucket in buckets.items():
+                bucket.level = min(bucket.capacity, bucket.level + cost[limit])
+
+        with self._lock:
+            self._with_global(give_back)
+            if key in self._users:
+                for bucket in self._users[key].values():
+                    bucket.refill()
+                give_back(self._users[key])
+
+    def _prune(self):
+        # A full bucket is the same as a fresh one, so idle callers can be forgotten
+        for key in list(self._users):
+            buckets = self._users[key]
+            for bucket in buckets.values():
+                bucket.refill()
+            if all(bucket.is_full() for bucket in buckets.values()):
+                del self._users[key]
+
+    def stats(self):
+        with self._lock:
+            levels = self._with_global(lambda buckets: {limit: bucket.level for limit, bucket in buckets.items()})
+            return {
+                'users': len(self._users),
+                'global_requests_available': levels['requests'],
+                'global_tokens_available': levels['tokens'],
+                'throttled_user': self.throttled['user'],
+                'throttled_global': self.throttled['global']
+            }
@@ -0,0 +1,216 @@
+# reading_schema.py
+"""The diabetes and hypertension questionnaires, defined once.
+
+Each questionnaire is compiled into a Schema: an ordered tuple of typed
+fields plus a compact record class (one `__slots__` attribute per field)
+built for it. Answers are parsed and validated once, where they enter the
+system (Socket.IO, dia.py/hyper.py prompts, batch files), and everything
+downstream reads typed attributes:
+
+    reading = DIABETES.parse(answers)          # raises SchemaError
+    reading.sugar_level, reading.reading_type  # 142.0, 'fasting'
+
+Answers can be keyed by the question text (with or without hints such as
+"(yes/no)", in any case/spacing) or by the field name.
+"""
+import re
+
+from risk_engine import reading_type
+
+
+class SchemaError(ValueError):
+    """Raised when answers don't fit the questionnaire; lists every problem"""
+
+    def __init__(self, problems):
+        super().__init__("; ".join(problems))
+        self.problems = problems
+
+
+_HINT = re.compile(r'\s*\([^)]*\)\s*$')
+
+
+def normalize_key(text):
+    """Question text or field name -> lookup key: lower case, single spaces, no trailing hint"""
+    text = ' '.join(str(text).lower().split())
+    return _HINT.sub('', text).rstrip('?').strip()
+
+
+# ================== Field types ==================
+
+YES = {'yes', 'y', 'true', '1'}
+NO = {'no', 'n', 'false', '0'}
+
+
+def parse_yes_no(text):
+    # First word, so "yes, this morning" still counts
+    word = text.split()[0].strip('.,!')
+    if word in YES:
+        return True
+    if word in NO:
+        return False
+    raise ValueError("expected yes or no")
+
+
+def format_yes_no(value):
+    return 'yes' if value else 'no'
+
+
+def parse_number(text):
+    try:
+        return float(text)
+    except ValueError:
+        raise ValueError("expected a number") from None
+
+
+class Field:
+    __slots__ = ('name', 'question', 'parse_value', 'format_value', 'required', 'low', 'high')
+
+    def __init__(self, name, question, parse_value, format_value=str, required=False, low=None, high=None):
+        self.name = name
+        self.question = question
+        self.parse_value = parse_value
+        self.format_value = format_value
+        self.required = required
+        self.low = low
+        self.high = high
+
+    def parse(self, raw):
+        """Typed value for a raw answer; None if unanswered. Raises ValueError."""
+        if raw is None:
+            return None
+        text = str(raw).strip().lower()
+        if not text:
+            return None
+        value = self.parse_value(text)
+        if self.low is not None and not self.low <= value <= self.high:
+            raise ValueError(f"must be between {self.low:g} and {self.high:g}")
+        return value
+
+    def format(self, value):
+        return '' if value is None else self.format_value(value)
+
+
+def number(name, question, low, high, required=False):
+    return Field(name, question, parse_number, lambda value: f"{value:g}", required, low, high)
+
+
+def yes_no(name, question):
+    return Field(name, question, parse_yes_no, format_yes_no)
+
+
+# ================== Schemas ==================
+
+class Schema:
+    def __init__(self, condition, fields):
+        self.condition = condition
+        self.fields = tuple(fields)
+        self.questions = [field.question for field in self.fields]
+        self._index = {}
+        for position, field in enumerate(self.fields):
+            self._index[normalize_key(field.question)] = position
+            self._index[field.name] = position
+        self.record_class = _make_record_class(condition, self)
+
+    def field(self, name):
+        return self.fields[self._index[name]]
+
+    def parse(self, answers, lenient=False):
+        """Validate a dict of raw answers; returns a record or raises SchemaError.
+
+        With lenient=True (old records files), optional answers that don't
+        parse are left unset instead of failing the whole record.
+        """
+        if not isinstance(answers, dict):
+            raise SchemaError(["answers must be an object"])
+
+        raw = [None] * len(self.fields)
+        for key, value in answers.items():
+            if key is None:
+                continue
+            position = self._index.get(normalize_key(key))
+            if position is not None:
+                raw[position] = value
+
+        values = []
+        problems = []
+        for field, value in zip(self.fields, raw):
+            try:
+                value = field.parse(value)
+            except ValueError as e:
+                if lenient and not field.required:
+                    values.append(None)
+                    continue
+                problems.append(f"invalid {field.name} ({value!r}): {str(e)}")
+                values.append(None)
+                continue
+            if value is None and field.required:
+                problems.append(f"missing {field.name}")
+            values.append(value)
+
+        if problems:
+            raise SchemaError(problems)
+        return self.record_class(*values)
+
+
+def _make_record_class(condition, schema):
+    names = tuple(field.name for field in schema.fields)
+
+    def __init__(self, *values):
+        for name, value in zip(names, values):
+            setattr(self, name, value)
+
+    def values(self):
+        return tuple(getattr(self, name) for name in names)
+
+    def format(self, name):
+        """One answer as text for prompts; '' if unanswered"""
+        return schema.field(name).format(getattr(self, name))
+
+    def to_answers(self):
+        """{question: formatted answer}, the shape stored in the records files"""
+        return {field.question: field.format(getattr(self, field.name)) for field in schema.fields}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in names)})"
+
+    return type(f"{condition.title()}Reading", (), {
+        '__slots__': names,
+        '__init__': __init__,
+        'schema': schema,
+        'condition': condition,
+        'values': values,
+        'format': format,
+        'to_answers': to_answers,
+        '__repr__': __repr__
+    })
+
+
+DIABETES = Schema('diabetes', [
+    number('sugar_level', "What is your current blood sugar level (mg/dL)?", 10, 2000, required=True),
+    Field('reading_type', "Is this a fasting reading or post-meal? (fasting/post)", reading_type),
+    yes_no('medication', "Have you taken your medication today? (yes/no)"),
+    yes_no('high_carb_food', "Did you consume any sugary or high-carb food today? (yes/no)"),
+    yes_no('exercised', "Have you exercised today? (yes/no)"),
+    number('sleep_hours', "How many hours did you sleep last night?", 0, 24),
+    yes_no('symptoms', "Do you feel any symptoms like fatigue, thirst, or blurred vision? (yes/no)"),
+    yes_no('same_time', "Did you monitor your sugar level at the same time as yesterday? (yes/no)")
+])
+
+HYPERTENSION = Schema('hypertension', [
+    number('systolic', "What is your systolic blood pressure (upper number)?", 40, 300, required=True),
+    number('diastolic', "What is your diastolic blood pressure (lower number)?", 20, 200, required=True),
+    yes_no('symptoms', "Have you experienced any dizziness or headaches? (yes/no)"),
+    yes_no('medication', "Have you taken hypertension medication? (yes/no)"),
+    yes_no('exercised', "Did you exercise today? (yes/no)"),
+    number('sleep_hours', "How many hours did you sleep last night?", 0, 24),
+    yes_no('stressed', "Have you been feeling stressed lately? (yes/no)"),
+    yes_no('salty_food', "Did you consume salty or processed foods today? (yes/no)"),
+    number('water_liters', "How much water have you consumed today? (in liters)", 0, 20)
+])
+
+SCHEMAS = {schema.condition: schema for schema in (DIABETES, HYPERTENSION)}
+
+
+def get_schema(condition):
+    """The schema for 'diabetes' or 'hypertension'; raises KeyError otherwise"""
+    return SCHEMAS[condition]
@@ -0,0 +1,222 @@
+# reading_store.py
+"""Persistent, indexed time-series store for glucose and blood pressure readings.
+
+Backed by SQLite in WAL mode. Every filter combination /api/readings and
+the backfills use has an index ending in ts: (patient, condition, ts),
+(patient, ts), (condition, ts) and (ts). So per-patient history and time
+range queries read rows in order without sorting as the table grows. Also imports the JSONL records written by dia.py and hyper.py:
+
+    python reading_store.py import diabetes_records.json --condition diabetes
+"""
+import argparse
+import json
+import os
+from datetime import datetime
+
+from db import ThreadConnections
+from reading_schema import SchemaError, get_schema
+from risk_engine import classify_glucose, classify_bp
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    id INTEGER PRIMARY KEY,
+    patient TEXT NOT NULL,
+    condition TEXT NOT NULL,
+    ts REAL NOT NULL,
+    value REAL NOT NULL,
+    value2 REAL,
+    category TEXT,
+    risk_level TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_readings_patient_condition_ts ON readings (patient, condition, ts);
+CREATE INDEX IF NOT EXISTS idx_readings_condition_ts ON readings (condition, ts);
+CREATE INDEX IF NOT EXISTS idx_readings_patient_ts ON readings (patient, ts);
+CREATE INDEX IF NOT EXISTS idx_readings_ts ON readings (ts);
+"""
+
+COLUMNS = "id, patient, condition, ts, value, value2, category, risk_level, data"
+
+def to_timestamp(value):
+    """Accept epoch seconds or an ISO-8601 string and return epoch seconds"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+class ReadingStore:
+    def __init__(self, path):
+        self.path = path
+        self._db = ThreadConnections(path)
+        with self._db.get() as conn:
+            conn.executescript(SCHEMA)
+
+    def add(self, patient, condition, value, value2=None, category=None, risk_level=None,
+            data=None, timestamp=None):
+        """Insert one reading and return it as a dict"""
+        row = (patient, condition, to_timestamp(timestamp) or datetime.now().timestamp(),
+               value, value2, category, risk_level, json.dumps(data) if data else None)
+        with self._db.get() as conn:
+            cursor = conn.execute(
+                "INSERT INTO readings (patient, condition, ts, value, value2, category, risk_level, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+        return self._to_dict((cursor.lastrowid,) + row)
+
+    def add_many(self, rows, batch_size=5000):
+        """Insert many readings in batched transactions.
+
+        rows is an iterable of dicts with the same keys as add(). Returns the
+        number of rows inserted.
+        """
+        count = 0
+        batch = []
+        conn = self._db.get()
+        for row in rows:
+            batch.append((row['patient'], row['condition'],
+                          to_timestamp(row.get('timestamp')) or datetime.now().timestamp(),
+                          row['value'], row.get('value2'), row.get('category'), row.get('risk_level'),
+                          json.dumps(row['data']) if row.get('data') else None))
+            if len(batch) >= batch_size:
+                count += self._insert_batch(conn, batch)
+                batch = []
+        if batch:
+            count += self._insert_batch(conn, batch)
+        return count
+
+    def _insert_batch(self, conn, batch):
+        with conn:
+            conn.executemany(
+                "INSERT INTO readings (patient, condition, ts, value, value2, category, risk_level, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+        return len(batch)
+
+    def query(self, patient=None, condition=None, start=None, end=None, limit=1000, descending=False):
+        """Return readings matching the filters, ordered by time"""
+        clauses = []
+        params = []
+        for column, value in (('patient', patient), ('condition', condition)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        # An empty bound (e.g. ?from=) means no bound, not "compare with NULL"
+        for clause, value in (("ts >= ?", to_timestamp(start)), ("ts <= ?", to_timestamp(end))):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+
+        sql = f"SELECT {COLUMNS} FROM readings"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY ts {'DESC' if descending else 'ASC'}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        return [self._to_dict(row) for row in self._db.get().execute(sql, params)]
+
+    def since_id(self, last_id, limit=None):
+        """Readings inserted after the reading with id last_id, in insertion order"""
+        sql = f"SELECT {COLUMNS} FROM readings WHERE id > ? ORDER BY id"
+        params = [last_id]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return [self._to_dict(row) for row in self._db.get().execute(sql, params)]
+
+    def latest(self, condition, patient=None):
+        rows = self.query(patient=patient, condition=condition, limit=1, descending=True)
+        return rows[0] if rows else None
+
+    def count(self):
+        return self._db.get().execute("SELECT COUNT(*) FROM readings").fetchone()[0]
+
+    @staticmethod
+    def _to_dict(row):
+        reading_id, patient, condition, ts, value, value2, category, risk_level, data = row
+        return {
+            'id': reading_id,
+            'patient': patient,
+            'condition': condition,
+            'timestamp': datetime.fromtimestamp(ts).isoformat(),
+            'value': value,
+            'value2': value2,
+            'category': category,
+            'risk_level': risk_level,
+            'data': json.loads(data) if data else {}
+        }
+
+
+def parse_record(entry, condition, patient):
+    """Turn one dia.py/hyper.py JSONL entry into a reading row (or None if unusable)"""
+    try:
+        # Lenient: older files have free-text lifestyle answers we don't need here
+        reading = get_schema(condition).parse(entry.get('data', {}), lenient=True)
+    except SchemaError:
+        return None
+
+    if condition == 'diabetes':
+        value = reading.sugar_level
+        kind = reading.reading_type or 'post'
+        category, risk_level = classify_glucose(value, kind == 'fasting')
+        value2 = None
+        data = {'reading_type': kind}
+    else:
+        value = reading.systolic
+        value2 = reading.diastolic
+        category, risk_level = classify_bp(value, value2)
+        data = None
+
+    return {
+        'patient': patient,
+        'condition': condition,
+        'timestamp': entry.get('timestamp'),
+        'value': value,
+        'value2': value2,
+        'category': category,
+        'risk_level': risk_level,
+        'data': data
+    }
+
+
+def import_jsonl(store, path, condition, patient='patient', batch_size=5000):
+    """Import a dia.py/hyper.py records file; returns (imported, skipped)"""
+    skipped = 0
+
+    def rows():
+        nonlocal skipped
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = parse_record(json.loads(line), condition, patient)
+                except json.JSONDecodeError:
+                    row = None
+                if row is None:
+                    skipped += 1
+                    continue
+                yield row
+
+    imported = store.add_many(rows(), batch_size=batch_size)
+    return imported, skipped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HealthSync reading store tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Import a JSONL records file")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--condition", choices=["diabetes", "hypertension"], required=True)
+    import_parser.add_argument("--patient", default="patient")
+    import_parser.add_argument("--db", default=os.path.join("data", "readings.db"))
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.db) or ".", exist_ok=True)
+    imported, skipped = import_jsonl(ReadingStore(args.db), args.path, args.condition, args.patient)
+    print(f"Imported {imported} readings from {args.path} ({skipped} skipped)")
@@ -0,0 +1,198 @@
+# resilience.py
+"""Keeping Groq outages from turning into long waits for users.
+
+- CircuitBreaker: watches the recent error rate and slow-call rate. When
+  either crosses its threshold the circuit opens and calls fail fast (the
+  app answers from a local template) until a cool-down has passed; then a
+  few trial calls decide whether to close it again.
+- backoff_delay / retry_after_seconds: jittered exponential backoff for
+  429/5xx that honours the server's Retry-After header.
+- LatencyWindow + hedge: if a call is slower than the recent p95 (say), send
+  a second identical request and take whichever answers first.
+"""
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling upstream while the circuit is open"""
+
+
+class CircuitBreaker:
+    def __init__(self, window=60.0, min_calls=10, failure_rate=0.5, slow_call_seconds=10.0,
+                 slow_call_rate=0.5, open_seconds=30.0, half_open_calls=2, clock=time.monotonic):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._clock = clock
+
+        self.state = CLOSED
+        self._calls = deque()  # (time, failed, slow) within the window
+        self._failures = 0
+        self._slow = 0
+        self._opened_at = 0.0
+        self._trials = 0       # calls let through while half-open
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go upstream now"""
+        with self._lock:
+            if self.state == OPEN:
+                if self._clock() - self._opened_at < self.open_seconds:
+                    return False
+                self.state = HALF_OPEN
+                self._trials = 0
+            if self.state == HALF_OPEN:
+                if self._trials >= self.half_open_calls:
+                    return False
+                self._trials += 1
+            return True
+
+    def record(self, success, duration):
+        with self._lock:
+            slow = duration >= self.slow_call_seconds
+            if self.state == HALF_OPEN:
+                if not success or slow:
+                    self._open()
+                elif self._trials >= self.half_open_calls:
+                    self._reset(CLOSED)
+                return
+            if self.state == OPEN:
+                # A call that started before the circuit opened
+                return
+
+            now = self._clock()
+            self._calls.append((now, not success, slow))
+            self._failures += not success
+            self._slow += slow
+            self._expire(now)
+
+            calls = len(self._calls)
+            if calls >= self.min_calls and (self._failures / calls >= self.failure_rate
+                                            or self._slow / calls >= self.slow_call_rate):
+                self._open()
+
+    def _expire(self, now):
+        while self._calls and now - self._calls[0][0] > self.window:
+            _, failed, slow = self._calls.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+    def _open(self):
+        print(f"Circuit opened; failing fast for {self.open_seconds:g}s")
+        self._reset(OPEN)
+        self._opened_at = self._clock()
+
+    def _reset(self, state):
+        if state == CLOSED and self.state != CLOSED:
+            print("Circuit closed")
+        self.state = state
+        self._calls.clear()
+        self._failures = 0
+        self._slow = 0
+
+    def stats(self):
+        with self._lock:
+            calls = len(self._calls)
+            return {
+                'state': self.state,
+                'calls': calls,
+                'failure_rate': self._failures / calls if calls else 0.0,
+                'slow_call_rate': self._slow / calls if calls else 0.0
+            }
+
+
+def retry_after_seconds(response):
+    """Seconds the server asked us to wait (Retry-After), or None"""
+    if response is None:
+        return None
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0, retry_after=None):
+    """Full-jitter exponential backoff; never sooner than Retry-After"""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class LatencyWindow:
+    """The last `size` successful call durations, for percentile estimates"""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, fraction):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+_hedge_executor = None
+_hedge_lock = threading.Lock()
+
+
+def _executor():
+    global _hedge_executor
+    with _hedge_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='hedge')
+        return _hedge_executor
+
+
+def hedge(fn, hedge_after):
+    """Call fn(); if it hasn't returned after hedge_after seconds, call it again.
+
+    Returns (result, hedged) from whichever call succeeds first. If both
+    fail, the first call's exception is raised. The slower call is left to
+    finish in the background and its result is discarded.
+    """
+    executor = _executor()
+    first = executor.submit(fn)
+    done, _ = wait([first], timeout=hedge_after)
+    if done:
+        return first.result(), False
+
+    second = executor.submit(fn)
+    pending = {first, second}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result(), True
+    return first.result(), True
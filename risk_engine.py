@@ -0,0 +1,128 @@
+# risk_engine.py
+"""Rule-based risk classification for glucose and blood pressure readings.
+
+Runs locally on the parsed answers so the dashboard gets a risk level right
+away instead of waiting for (and guessing from) the LLM narrative. The same
+threshold tables drive the scalar functions and the NumPy batch versions.
+
+Risk levels: 'low', 'medium', 'high', 'critical'
+"""
+from bisect import bisect_right
+
+# Glucose (mg/dL). Each table is (upper bounds, bands); a value falls into
+# bands[i] where i is the number of bounds that are <= value.
+GLUCOSE_BANDS = {
+    'fasting': (
+        (54, 70, 100, 126, 300),
+        (('severe_hypoglycemia', 'critical'),
+         ('hypoglycemia', 'high'),
+         ('normal', 'low'),
+         ('prediabetes', 'medium'),
+         ('diabetes', 'high'),
+         ('severe_hyperglycemia', 'critical'))
+    ),
+    'post': (
+        (54, 70, 140, 200, 300),
+        (('severe_hypoglycemia', 'critical'),
+         ('hypoglycemia', 'high'),
+         ('normal', 'low'),
+         ('prediabetes', 'medium'),
+         ('diabetes', 'high'),
+         ('severe_hyperglycemia', 'critical'))
+    )
+}
+
+# Blood pressure (mmHg), ACC/AHA categories ordered by severity
+BP_CATEGORIES = ('normal', 'elevated', 'hypotension', 'stage_1', 'stage_2', 'crisis')
+BP_RISK = ('low', 'medium', 'medium', 'medium', 'high', 'critical')
+
+SYSTOLIC_BOUNDS = (90, 120, 130, 140)
+SYSTOLIC_RANKS = (2, 0, 1, 3, 4)   # hypotension, normal, elevated, stage_1, stage_2
+DIASTOLIC_BOUNDS = (60, 80, 90)
+DIASTOLIC_RANKS = (2, 0, 3, 4)     # hypotension, normal, stage_1, stage_2
+
+CRISIS_SYSTOLIC = 180
+CRISIS_DIASTOLIC = 120
+
+# Risk levels from least to most severe
+RISK_LEVELS = ('low', 'medium', 'high', 'critical')
+
+
+def reading_type(answer):
+    """Map the fasting/post answer to a glucose table name"""
+    return 'fasting' if str(answer).strip().lower().startswith('f') else 'post'
+
+
+def classify_glucose(value, fasting):
+    """Return (category, risk_level) for a single glucose reading"""
+    bounds, bands = GLUCOSE_BANDS['fasting' if fasting else 'post']
+    return bands[bisect_right(bounds, value)]
+
+
+def classify_bp(systolic, diastolic):
+    """Return (category, risk_level) for a single blood pressure reading"""
+    if systolic > CRISIS_SYSTOLIC or diastolic > CRISIS_DIASTOLIC:
+        rank = BP_CATEGORIES.index('crisis')
+    else:
+        rank = max(SYSTOLIC_RANKS[bisect_right(SYSTOLIC_BOUNDS, systolic)],
+                   DIASTOLIC_RANKS[bisect_right(DIASTOLIC_BOUNDS, diastolic)])
+    return BP_CATEGORIES[rank], BP_RISK[rank]
+
+
+def _deviation(value, low, high):
+    """How far outside [low, high] a value is, as a fraction of the bound it crossed"""
+    if value < low:
+        return (low - value) / low
+    if value > high:
+        return (value - high) / high
+    return 0.0
+
+
+def glucose_deviation(value, fasting):
+    """Relative distance of a glucose reading from the normal band (0 when normal)"""
+    bounds, bands = GLUCOSE_BANDS['fasting' if fasting else 'post']
+    normal = [band[0] for band in bands].index('normal')
+    return _deviation(value, bounds[normal - 1], bounds[normal])
+
+
+def bp_deviation(systolic, diastolic):
+    """Largest relative distance of either number from its normal range"""
+    return max(_deviation(systolic, SYSTOLIC_BOUNDS[0], SYSTOLIC_BOUNDS[1]),
+               _deviation(diastolic, DIASTOLIC_BOUNDS[0], DIASTOLIC_BOUNDS[1]))
+
+
+def classify_glucose_batch(values, fasting):
+    """Vectorized classify_glucose.
+
+    values and fasting are array-likes of the same length; returns
+    (categories, risk_levels) as NumPy string arrays.
+    """
+    import numpy as np
+
+    values = np.asarray(values, dtype=float)
+    fasting = np.asarray(fasting, dtype=bool)
+
+    categories = np.empty(values.shape, dtype=object)
+    risks = np.empty(values.shape, dtype=object)
+    for name, mask in (('fasting', fasting), ('post', ~fasting)):
+        bounds, bands = GLUCOSE_BANDS[name]
+        idx = np.searchsorted(bounds, values[mask], side='right')
+        categories[mask] = np.array([band[0] for band in bands], dtype=object)[idx]
+        risks[mask] = np.array([band[1] for band in bands], dtype=object)[idx]
+    return categories.astype(str), risks.astype(str)
+
+
+def classify_bp_batch(systolic, diastolic):
+    """Vectorized classify_bp; returns (categories, risk_levels) as NumPy string arrays"""
+    import numpy as np
+
+    systolic = np.asarray(systolic, dtype=float)
+    diastolic = np.asarray(diastolic, dtype=float)
+
+    ranks = np.maximum(
+        np.asarray(SYSTOLIC_RANKS)[np.searchsorted(SYSTOLIC_BOUNDS, systolic, side='right')],
+        np.asarray(DIASTOLIC_RANKS)[np.searchsorted(DIASTOLIC_BOUNDS, diastolic, side='right')]
+    )
+    crisis = (systolic > CRISIS_SYSTOLIC) | (diastolic > CRISIS_DIASTOLIC)
+    ranks = np.where(crisis, BP_CATEGORIES.index('crisis'), ranks)
+    return np.asarray(BP_CATEGORIES)[ranks], np.asarray(BP_RISK)[ranks]
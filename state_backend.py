@@ -0,0 +1,201 @@
+# state_backend.py
+"""Pluggable storage for app state that has to be shared between workers.
+
+State is kept as named collections of JSON-serializable records. Every put
+gets a new, per-collection version number, so a worker can keep its own
+indexes in memory and cheaply pull only what other workers changed:
+
+    records, version = backend.changes_since('appointments', my_version)
+
+MemoryBackend is for a single process; given a Journal it survives restarts.
+SQLiteBackend (WAL mode) lets every worker process on a machine share one
+state file.
+"""
+import json
+import threading
+from collections import OrderedDict
+
+from db import ThreadConnections
+
+
+class StateBackend:
+    def put(self, collection, record_id, record):
+        """Store a record and return its new version"""
+        raise NotImplementedError
+
+    def get(self, collection, record_id):
+        raise NotImplementedError
+
+    def update(self, collection, record_id, fn):
+        """Read-modify-write one record atomically, also across processes.
+
+        fn(record or None) returns (new_record, result); the record is
+        stored unless new_record is None, and result is returned.
+        """
+        raise NotImplementedError
+
+    def changes_since(self, collection, version):
+        """Records put after `version`, oldest first, and the latest version"""
+        raise NotImplementedError
+
+    def version(self, collection):
+        raise NotImplementedError
+
+
+class MemoryBackend(StateBackend):
+    def __init__(self, journal=None):
+        self._collections = {}  # name -> OrderedDict(id -> (version, record)), oldest first
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.journal = journal
+        if journal is not None:
+            self._recover()
+
+    def _recover(self):
+        state, entries = self.journal.recover()
+        if state is not None:
+            for collection, records in state['collections'].items():
+                self._collections[collection] = OrderedDict(
+                    (record_id, (version, record)) for record_id, version, record in records)
+            self._versions = state['versions']
+        for entry in entries:
+            self._apply(entry['c'], entry['id'], entry['v'], entry['r'])
+
+    def _apply(self, collection, record_id, version, record):
+        records = self._collections.setdefault(collection, OrderedDict())
+        self._versions[collection] = version
+        records.pop(record_id, None)
+        records[record_id] = (version, record)
+
+    def _export(self):
+        return {
+            'collections': {
+                collection: [[record_id, version, record] for record_id, (version, record) in records.items()]
+                for collection, records in self._collections.items()
+            },
+            'versions': dict(self._versions)
+        }
+
+    def _put(self, collection, record_id, record):
+        version = self._versions.get(collection, 0) + 1
+        record = dict(record)
+        self._apply(collection, record_id, version, record)
+        if self.journal is not None:
+            self.journal.append({'c': collection, 'id': record_id, 'v': version, 'r': record})
+            if self.journal.should_snapshot():
+                self.journal.snapshot(self._export())
+        return version
+
+    def put(self, collection, record_id, record):
+        with self._lock:
+            return self._put(collection, record_id, record)
+
+    def get(self, collection, record_id):
+        with self._lock:
+            entry = self._collections.get(collection, {}).get(record_id)
+            return dict(entry[1]) if entry else None
+
+    def update(self, collection, record_id, fn):
+        with self._lock:
+            entry = self._collections.get(collection, {}).get(record_id)
+            record, result = fn(dict(entry[1]) if entry else None)
+            if record is not None:
+                self._put(collection, record_id, record)
+            return result
+
+    def changes_since(self, collection, version):
+        with self._lock:
+            current = self._versions.get(collection, 0)
+            if current <= version:
+                return [], current
+            changed = []
+            # Newest entries are at the end; walk back until we reach what the caller has
+            for record_version, record in reversed(self._collections[collection].values()):
+                if record_version <= version:
+                    break
+                changed.append((record_version, dict(record)))
+            changed.reverse()
+            return changed, current
+
+    def version(self, collection):
+        with self._lock:
+            return self._versions.get(collection, 0)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+);
+CREATE INDEX IF NOT EXISTS idx_records_collection_version ON records (collection, version);
+CREATE TABLE IF NOT EXISTS versions (
+    collection TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+
+class SQLiteBackend(StateBackend):
+    def __init__(self, path):
+        self.path = path
+        self._db = ThreadConnections(path)
+        with self._db.get() as conn:
+            conn.executescript(SQLITE_SCHEMA)
+
+    def _put(self, conn, collection, record_id, record):
+        # The version bump takes the write lock, so versions are unique across processes
+        version = conn.execute(
+            "INSERT INTO versions (collection, version) VALUES (?, 1) "
+            "ON CONFLICT (collection) DO UPDATE SET version = version + 1 RETURNING version",
+            (collection,)).fetchone()[0]
+        conn.execute(
+            "INSERT OR REPLACE INTO records (collection, id, version, data) VALUES (?, ?, ?, ?)",
+            (collection, record_id, version, json.dumps(record)))
+        return version
+
+    def put(self, collection, record_id, record):
+        with self._db.get() as conn:
+            return self._put(conn, collection, record_id, record)
+
+    def get(self, collection, record_id):
+        row = self._db.get().execute(
+            "SELECT data FROM records WHERE collection = ? AND id = ?", (collection, record_id)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, collection, record_id, fn):
+        with self._db.get() as conn:
+            # Take the write lock before reading, so no other process can change the record in between
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT data FROM records WHERE collection = ? AND id = ?", (collection, record_id)).fetchone()
+            record, result = fn(json.loads(row[0]) if row else None)
+            if record is not None:
+                self._put(conn, collection, record_id, record)
+        return result
+
+    def changes_since(self, collection, version):
+        rows = self._db.get().execute(
+            "SELECT version, data FROM records WHERE collection = ? AND version > ? ORDER BY version",
+            (collection, version)).fetchall()
+        if not rows:
+            return [], version
+        return [(row[0], json.loads(row[1])) for row in rows], rows[-1][0]
+
+    def version(self, collection):
+        row = self._db.get().execute(
+            "SELECT version FROM versions WHERE collection = ?", (collection,)).fetchone()
+        return row[0] if row else 0
+
+
+def create_backend(kind='memory', path=None, journal_dir=None, snapshot_every=10000):
+    if kind == 'memory':
+        if not journal_dir:
+            return MemoryBackend()
+        from journal import Journal
+        return MemoryBackend(Journal(journal_dir, snapshot_every))
+    if kind == 'sqlite':
+        return SQLiteBackend(path)
+    raise ValueError(f"Unknown state backend: {kind}")
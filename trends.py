@@ -0,0 +1,225 @@
+# trends.py
+"""Rolling per-patient trend statistics for glucose and blood pressure.
+
+Each (patient, condition) keeps one bucket of running sums per day for the
+last 30 days. Recording a reading touches a single bucket (O(1)), and a
+summary only adds up at most 30 buckets, so dashboards never scan history.
+backfill() builds the same buckets from a batch of stored readings with NumPy,
+and sync() folds in readings stored since (by this or any other worker).
+"""
+import threading
+import time
+
+from reading_store import to_timestamp
+
+WINDOWS = (7, 30)
+MAX_DAYS = max(WINDOWS)
+
+# Glucose time-in-range target (mg/dL)
+TARGET_LOW = 70
+TARGET_HIGH = 180
+
+# Local hours counted as morning / evening for blood pressure averages
+MORNING_HOURS = (4, 12)
+EVENING_HOURS = (17, 24)
+
+# Bucket layouts
+GLUCOSE_FIELDS = ('count', 'sum', 'sum_sq', 'in_range')
+BP_FIELDS = ('count', 'systolic', 'diastolic',
+             'morning_count', 'morning_systolic', 'morning_diastolic',
+             'evening_count', 'evening_systolic', 'evening_diastolic')
+
+
+def _utc_offset():
+    return time.localtime().tm_gmtoff
+
+
+def day_and_hour(ts, offset=None):
+    """Local day number and hour for an epoch timestamp"""
+    local = ts + (_utc_offset() if offset is None else offset)
+    return int(local // 86400), int(local % 86400 // 3600)
+
+
+def glucose_contribution(value):
+    in_range = 1.0 if TARGET_LOW <= value <= TARGET_HIGH else 0.0
+    return (1.0, value, value * value, in_range)
+
+
+def bp_contribution(hour, systolic, diastolic):
+    morning = 1.0 if MORNING_HOURS[0] <= hour < MORNING_HOURS[1] else 0.0
+    evening = 1.0 if EVENING_HOURS[0] <= hour < EVENING_HOURS[1] else 0.0
+    return (1.0, systolic, diastolic,
+            morning, morning * systolic, morning * diastolic,
+            evening, evening * systolic, evening * diastolic)
+
+
+class RollingDailyAggregate:
+    """Per-day running sums of a fixed set of fields, kept for MAX_DAYS days"""
+
+    def __init__(self, width):
+        self.width = width
+        self.buckets = {}  # day number -> list of sums
+        self.newest = None
+
+    def add(self, day, contribution):
+        if self.newest is not None and day <= self.newest - MAX_DAYS:
+            return  # Older than anything we report on
+        bucket = self.buckets.get(day)
+        if bucket is None:
+            bucket = self.buckets[day] = [0.0] * self.width
+        for i, value in enumerate(contribution):
+            bucket[i] += value
+        if self.newest is None or day > self.newest:
+            self.newest = day
+            self._prune()
+
+    def _prune(self):
+        cutoff = self.newest - MAX_DAYS
+        for day in [d for d in self.buckets if d <= cutoff]:
+            del self.buckets[day]
+
+    def totals(self, today, days):
+        sums = [0.0] * self.width
+        for day, bucket in self.buckets.items():
+            if today - days < day <= today:
+                for i, value in enumerate(bucket):
+                    sums[i] += value
+        return sums
+
+
+def summarize_glucose(sums):
+    if not sums or not sums[0]:
+        return {'count': 0}
+    count, total, total_sq, in_range = sums
+    mean = total / count
+    variance = max(total_sq / count - mean * mean, 0.0)
+    std = variance ** 0.5
+    return {
+        'count': int(count),
+        'mean': round(mean, 1),
+        'std': round(std, 1),
+        'cv_percent': round(std / mean * 100, 1) if mean else None,
+        'time_in_range_percent': round(in_range / count * 100, 1)
+    }
+
+
+def summarize_bp(sums):
+    if not sums or not sums[0]:
+        return {'count': 0}
+    (count, systolic, diastolic,
+     morning_count, morning_systolic, morning_diastolic,
+     evening_count, evening_systolic, evening_diastolic) = sums
+
+    def average(total, n):
+        return round(total / n, 1) if n else None
+
+    return {
+        'count': int(count),
+        'mean_systolic': average(systolic, count),
+        'mean_diastolic': average(diastolic, count),
+        'morning': {
+            'count': int(morning_count),
+            'mean_systolic': average(morning_systolic, morning_count),
+            'mean_diastolic': average(morning_diastolic, morning_count)
+        },
+        'evening': {
+            'count': int(evening_count),
+            'mean_systolic': average(evening_systolic, evening_count),
+            'mean_diastolic': average(evening_diastolic, evening_count)
+        }
+    }
+
+
+class TrendTracker:
+    def __init__(self):
+        self._aggregates = {}  # (patient, condition) -> RollingDailyAggregate
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()  # one sync() at a time, from fetch to apply
+        self.last_reading_id = 0
+
+    def _aggregate(self, patient, condition):
+        key = (patient, condition)
+        aggregate = self._aggregates.get(key)
+        if aggregate is None:
+            width = len(GLUCOSE_FIELDS if condition == 'diabetes' else BP_FIELDS)
+            aggregate = self._aggregates[key] = RollingDailyAggregate(width)
+        return aggregate
+
+    def record(self, reading):
+        """Fold one stored reading (a ReadingStore dict) into the running aggregates.
+
+        Readings at or below last_reading_id have been counted already and are skipped.
+        """
+        ts = to_timestamp(reading['timestamp'])
+        day, hour = day_and_hour(ts)
+        if reading['condition'] == 'diabetes':
+            contribution = glucose_contribution(reading['value'])
+        else:
+            contribution = bp_contribution(hour, reading['value'], reading['value2'])
+
+        with self._lock:
+            if reading['id'] <= self.last_reading_id:
+                return
+            self._aggregate(reading['patient'], reading['condition']).add(day, contribution)
+            self.last_reading_id = reading['id']
+
+    def sync(self, store):
+        """Record every reading the ReadingStore has gained since the last one seen"""
+        with self._sync_lock:
+            for reading in store.since_id(self.last_reading_id):
+                self.record(reading)
+
+    def backfill(self, readings):
+        """Build aggregates from a batch of stored readings using NumPy"""
+        import numpy as np
+
+        offset = _utc_offset()
+        groups = {}
+        last_id = 0
+        for reading in readings:
+            groups.setdefault((reading['patient'], reading['condition']), []).append(reading)
+            last_id = max(last_id, reading['id'])
+        with self._lock:
+            self.last_reading_id = max(self.last_reading_id, last_id)
+
+        for (patient, condition), rows in groups.items():
+            ts = np.fromiter((to_timestamp(r['timestamp']) for r in rows), dtype=float, count=len(rows))
+            values = np.fromiter((r['value'] for r in rows), dtype=float, count=len(rows))
+            local = ts + offset
+            days = np.floor_divide(local, 86400).astype(np.int64)
+
+            if condition == 'diabetes':
+                in_range = ((values >= TARGET_LOW) & (values <= TARGET_HIGH)).astype(float)
+                columns = [np.ones_like(values), values, values * values, in_range]
+            else:
+                diastolic = np.fromiter((r['value2'] for r in rows), dtype=float, count=len(rows))
+                hours = (local % 86400 // 3600).astype(np.int64)
+                morning = ((hours >= MORNING_HOURS[0]) & (hours < MORNING_HOURS[1])).astype(float)
+                evening = ((hours >= EVENING_HOURS[0]) & (hours < EVENING_HOURS[1])).astype(float)
+                columns = [np.ones_like(values), values, diastolic,
+                           morning, morning * values, morning * diastolic,
+                           evening, evening * values, evening * diastolic]
+
+            # Sum every column per day in one pass
+            unique_days, inverse = np.unique(days, return_inverse=True)
+            sums = np.stack([np.bincount(inverse, weights=column, minlength=len(unique_days))
+                             for column in columns], axis=1)
+
+            with self._lock:
+                aggregate = self._aggregate(patient, condition)
+                for day, row in zip(unique_days.tolist(), sums.tolist()):
+                    aggregate.add(day, row)
+
+    def summary(self, patient, now=None):
+        """7- and 30-day statistics for one patient"""
+        today, _ = day_and_hour(now if now is not None else time.time())
+        result = {'patient': patient}
+        with self._lock:
+            for condition, summarize in (('diabetes', summarize_glucose), ('hypertension', summarize_bp)):
+                aggregate = self._aggregates.get((patient, condition))
+                result[condition] = {
+                    f"{days}d": summarize(aggregate.totals(today, days) if aggregate else None)
+                    for days in WINDOWS
+                }
+        return result
+
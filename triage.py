@@ -0,0 +1,148 @@
+# triage.py
+""""Who needs attention now": patients ranked by their latest readings.
+
+Each patient is ranked by their most urgent latest reading (one per
+condition), ordered by:
+
+1. risk level (critical first)
+2. recency, in RECENCY_BUCKET_SECONDS steps (newer first)
+3. how far the value is outside the normal range (risk_engine *_deviation)
+
+The ranking is a binary heap with lazy invalidation. A new reading pushes
+one entry for its patient (O(log n)) and leaves the patient's old entry in
+place, marked stale by a version number. top(k) pops entries until it has
+k live patients, then pushes them back (O(k log n)), so a request never
+sorts the whole population. Stale entries are dropped as they surface and
+the heap is rebuilt when they outnumber live ones. Readings older than
+max_age fall out of the index.
+"""
+import heapq
+import threading
+import time
+
+from reading_store import to_timestamp
+from risk_engine import RISK_LEVELS, bp_deviation, glucose_deviation
+
+RECENCY_BUCKET_SECONDS = 3600
+
+
+def reading_key(reading, ts):
+    """Sort key for one reading; larger is more urgent"""
+    if reading['condition'] == 'diabetes':
+        fasting = (reading.get('data') or {}).get('reading_type') == 'fasting'
+        deviation = glucose_deviation(reading['value'], fasting)
+    else:
+        deviation = bp_deviation(reading['value'], reading['value2'])
+    severity = RISK_LEVELS.index(reading['risk_level']) if reading['risk_level'] in RISK_LEVELS else 0
+    return (severity, int(ts // RECENCY_BUCKET_SECONDS), deviation)
+
+
+def reading_view(reading):
+    view = {
+        'value': reading['value'],
+        'timestamp': reading['timestamp'],
+        'category': reading['category'],
+        'risk_level': reading['risk_level']
+    }
+    if reading['condition'] == 'hypertension':
+        view['value'] = f"{reading['value']:g}/{reading['value2']:g}"
+    return view
+
+
+class TriageIndex:
+    def __init__(self, max_age=7 * 86400, clock=time.time):
+        self.max_age = max_age
+        self._clock = clock
+        self._patients = {}  # patient -> {'version', 'key', 'ts', 'readings': {condition: (reading, ts, key)}}
+        self._heap = []      # (negated key, -ts, version, patient)
+        self._lock = threading.Lock()
+        self.last_reading_id = 0
+
+    def __len__(self):
+        return len(self._patients)
+
+    def record(self, reading):
+        """Fold one stored reading (a ReadingStore dict) into the index"""
+        ts = to_timestamp(reading['timestamp'])
+        with self._lock:
+            self.last_reading_id = max(self.last_reading_id, reading.get('id') or 0)
+            if ts < self._clock() - self.max_age:
+                return
+            state = self._patients.setdefault(reading['patient'], {'version': 0, 'readings': {}})
+            current = state['readings'].get(reading['condition'])
+            if current is not None and current[1] > ts:
+                return  # Arrived out of order; the newer reading stays
+            state['readings'][reading['condition']] = (reading, ts, reading_key(reading, ts))
+            self._push(reading['patient'], state)
+
+    def sync(self, store):
+        """Record every reading the ReadingStore has gained since the last one seen"""
+        for reading in store.since_id(self.last_reading_id):
+            self.record(reading)
+
+    def backfill(self, readings):
+        for reading in readings:
+            self.record(reading)
+
+    def _push(self, patient, state):
+        # The patient ranks by their most urgent reading
+        reading, ts, key = max(state['readings'].values(), key=lambda item: (item[2], item[1]))
+        state['version'] += 1
+        state['key'] = key
+        state['ts'] = ts
+        heapq.heappush(self._heap, (tuple(-part for part in key), -ts, state['version'], patient))
+        if len(self._heap) > 2 * len(self._patients) + 64:
+            self._compact()
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if self._is_live(entry)]
+        heapq.heapify(self._heap)
+
+    def _is_live(self, entry):
+        state = self._patients.get(entry[3])
+        return state is not None and state['version'] == entry[2]
+
+    def _expire(self, patient, cutoff):
+        """Drop a patient's readings older than cutoff; re-rank them on what is left"""
+        state = self._patients[patient]
+        for condition, (_, ts, _) in list(state['readings'].items()):
+            if ts < cutoff:
+                del state['readings'][condition]
+        if state['readings']:
+            self._push(patient, state)
+        else:
+            del self._patients[patient]
+
+    def top(self, k=10):
+        """The k most urgent patients, most urgent first"""
+        cutoff = self._clock() - self.max_age
+        with self._lock:
+            live = []
+            while self._heap and len(live) < k:
+                entry = heapq.heappop(self._heap)
+                if not self._is_live(entry):
+                    continue
+                if -entry[1] < cutoff:
+                    self._expire(entry[3], cutoff)
+                    continue
+                live.append(entry)
+            for entry in live:
+                heapq.heappush(self._heap, entry)
+            return [self._to_dict(entry[3]) for entry in live]
+
+    def _to_dict(self, patient):
+        state = self._patients[patient]
+        readings = state['readings']
+        reading, _, _ = max(readings.values(), key=lambda item: (item[2], item[1]))
+        return {
+            'patient': patient,
+            'condition': reading['condition'],
+            'risk_level': reading['risk_level'],
+            'deviation': round(state['key'][2], 3),
+            'timestamp': reading['timestamp'],
+            'readings': {condition: reading_view(item[0]) for condition, item in readings.items()}
+        }
+
+    def stats(self):
+        with self._lock:
+            return {'patients': len(self._patients), 'heap_entries': len(self._heap)}
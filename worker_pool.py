@@ -0,0 +1,166 @@
+# worker_pool.py
+"""Bounded background pool for slow work (LLM calls) triggered by Socket.IO events.
+
+Each session gets its own FIFO queue that is worked off one job at a time, so
+replies arrive in the order they were asked. Sessions are served round-robin,
+so one chatty client cannot starve the others. Both the per-session and the
+global queue depth are capped; what happens on overflow is set by the
+rejection policy:
+
+    'reject'       refuse the new job
+    'drop_oldest'  discard the session's oldest pending job and accept the new one
+
+Jobs carry a priority lane (HIGH or NORMAL). Workers always take a session
+from the highest non-empty lane, so analyses and doctor traffic go ahead of
+free-form chat when the pool is busy; round-robin applies within a lane.
+"""
+import threading
+from collections import deque, OrderedDict
+
+REJECT = 'reject'
+DROP_OLDEST = 'drop_oldest'
+
+# Priority lanes, most urgent first
+HIGH = 0
+NORMAL = 1
+LANES = (HIGH, NORMAL)
+
+
+class QueueFull(Exception):
+    """Raised when a job cannot be queued"""
+
+
+class LLMWorkerPool:
+    def __init__(self, workers=4, max_queue=100, max_per_session=3, policy=REJECT, spawn=None):
+        if policy not in (REJECT, DROP_OLDEST):
+            raise ValueError(f"Unknown rejection policy: {policy}")
+
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_per_session = max_per_session
+        self.policy = policy
+        self._spawn = spawn or _spawn_thread
+
+        self._sessions = {}  # sid -> deque of pending jobs
+        self._lanes = [OrderedDict() for _ in LANES]  # per lane: sids with pending jobs and nothing running
+        self._running = set()
+        self._pending = 0
+        self._active = 0
+        self._cond = threading.Condition()
+        self._started = False
+
+    def start(self):
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(self.workers):
+            self._spawn(self._run)
+
+    def submit(self, sid, fn, *args, priority=NORMAL, **kwargs):
+        """Queue fn(*args, **kwargs) for the given session in a priority lane.
+
+        Returns the job that was dropped to make room (policy 'drop_oldest'),
+        or None. Raises QueueFull if the job was rejected.
+        """
+        if priority not in LANES:
+            raise ValueError(f"Unknown priority: {priority}")
+        if not self._started:
+            self.start()
+
+        job = (fn, args, kwargs, priority)
+        dropped = None
+        with self._cond:
+            queue = self._sessions.get(sid)
+            session_full = queue is not None and len(queue) >= self.max_per_session
+            pool_full = self._pending >= self.max_queue
+
+            if session_full and self.policy == DROP_OLDEST:
+                dropped = queue.popleft()
+                self._pending -= 1
+            elif session_full or pool_full:
+                raise QueueFull("Too many pending requests")
+
+            if queue is None:
+                queue = self._sessions[sid] = deque()
+            queue.append(job)
+            self._pending += 1
+            if sid not in self._running:
+                self._mark_ready(sid)
+            self._cond.notify()
+        return dropped
+
+    def cancel_session(self, sid):
+        """Forget all pending jobs for a session (e.g. on disconnect)"""
+        with self._cond:
+            queue = self._sessions.pop(sid, None)
+            for lane in self._lanes:
+                lane.pop(sid, None)
+            if queue:
+                self._pending -= len(queue)
+                return len(queue)
+        return 0
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pending': self._pending,
+                'active': self._active,
+                'sessions': len(self._sessions),
+                'workers': self.workers
+            }
+
+    def _mark_ready(self, sid):
+        # A session waits in the lane of its oldest pending job, keeping its
+        # place in line unless that lane changed
+        target = self._lanes[self._sessions[sid][0][3]]
+        if sid in target:
+            return
+        for lane in self._lanes:
+            lane.pop(sid, None)
+        target[sid] = True
+
+    def _next_ready(self):
+        for lane in self._lanes:
+            if lane:
+                return lane
+        return None
+
+    def _next_job(self):
+        with self._cond:
+            while self._next_ready() is None:
+                self._cond.wait()
+            # Round-robin: the session goes to the back of its lane once its job is done
+            sid, _ = self._next_ready().popitem(last=False)
+            queue = self._sessions[sid]
+            job = queue.popleft()
+            if not queue:
+                del self._sessions[sid]
+            self._running.add(sid)
+            self._pending -= 1
+            self._active += 1
+            return sid, job
+
+    def _finish(self, sid):
+        with self._cond:
+            self._running.discard(sid)
+            self._active -= 1
+            if sid in self._sessions:
+                self._mark_ready(sid)
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            sid, (fn, args, kwargs, _) = self._next_job()
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                print(f"Background job failed: {str(e)}")
+            finally:
+                self._finish(sid)
+
+
+def _spawn_thread(target):
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread